@@ -0,0 +1,78 @@
+"""
+Per-event CPU cost of the event bus codecs: encoding in the producer,
+decoding in the relay, and the relay's decode plus Socket.IO json
+re-encode compared with forwarding the encoded payload untouched.
+
+    python bench/event_codecs.py [iterations]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.realpath(os.path.join(__file__, '..', '..')))
+
+from onelove.codecs import codecs, get_codec  # noqa: E402
+
+event = {
+    'host': 'host1.example.com',
+    'provision_id': '5b4f1c2e9d1e8a0012345678',
+    'cluster_id': '5b4f1c2e9d1e8a0012345679',
+    'log': 'All items completed' * 8,
+    'status': 'item_ok',
+    'task': 'Install packages',
+    'timestamp': '2018-07-18T10:11:12:123456',
+    'type': 'log',
+}
+
+
+def measure(codec, iterations):
+    payload = codec.dumps(event)
+    if not codec.binary and isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+
+    def relay_decode():
+        json.dumps(codec.loads(payload))
+
+    def relay_raw():
+        if not codec.binary:
+            json.dumps(payload)
+
+    result = []
+    for func in [
+        lambda: codec.dumps(event),
+        lambda: codec.loads(payload),
+        relay_decode,
+        relay_raw,
+    ]:
+        took = timeit.timeit(func, number=iterations)
+        result.append(took / iterations * 1000000)
+    return len(payload), result
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(
+        '{:<8} {:>6} {:>9} {:>9} {:>13} {:>10}'.format(
+            'codec',
+            'bytes',
+            'encode',
+            'decode',
+            'relay decode',
+            'relay raw',
+        )
+    )
+    for name in codecs:
+        try:
+            codec = get_codec(name)
+        except ImportError:
+            print('{:<8} not installed'.format(name))
+            continue
+        size, times = measure(codec, iterations)
+        print(
+            '{:<8} {:>6} {:>7.2f}us {:>7.2f}us {:>11.2f}us {:>8.2f}us'.format(
+                name,
+                size,
+                *times
+            )
+        )
@@ -0,0 +1,59 @@
+"""
+Repeat provision cost with and without the ansible fact cache: runs a
+fact gathering playbook against an inventory twice per mode, using a
+jsonfile cache in a temporary directory.
+
+    python bench/fact_cache.py [inventory]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+playbook = '''---
+- hosts: all
+  tasks:
+    - ping:
+'''
+
+
+def run(inventory, playbook_path, env):
+    start = time.time()
+    subprocess.run(
+        ['ansible-playbook', '-i', inventory, playbook_path],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    inventory = sys.argv[1] if len(sys.argv) > 1 else 'localhost,'
+    workdir = tempfile.mkdtemp()
+    try:
+        playbook_path = os.path.join(workdir, 'site.yml')
+        with open(playbook_path, 'w') as f:
+            f.write(playbook)
+        plain = dict(os.environ, ANSIBLE_GATHERING='implicit')
+        cached = dict(
+            os.environ,
+            ANSIBLE_GATHERING='smart',
+            ANSIBLE_CACHE_PLUGIN='jsonfile',
+            ANSIBLE_CACHE_PLUGIN_CONNECTION=os.path.join(workdir, 'facts'),
+            ANSIBLE_CACHE_PLUGIN_TIMEOUT='3600',
+        )
+        for name, env in [('no cache', plain), ('fact cache', cached)]:
+            first = run(inventory, playbook_path, env)
+            second = run(inventory, playbook_path, env)
+            print(
+                '{:<10} first {:>7.2f}s repeat {:>7.2f}s'.format(
+                    name,
+                    first,
+                    second,
+                )
+            )
+    finally:
+        shutil.rmtree(workdir)
@@ -0,0 +1,72 @@
+"""
+Compare provision log ingestion: one write per event versus batched bulk
+inserts into the provision log collection. Needs a running mongodb
+(MONGODB_HOST, default localhost).
+
+    python bench/log_ingestion.py [events] [batch_size]
+"""
+import os
+import sys
+import time
+
+from mongoengine import connect
+
+sys.path.insert(0, os.path.realpath(os.path.join(__file__, '..', '..')))
+
+from onelove.models.provision import Provision, ProvisionLog  # noqa: E402
+
+
+def make_log(provision, index):
+    return ProvisionLog(
+        provision=provision,
+        host='host{}'.format(index % 50),
+        log='message {}'.format(index),
+        status='ok',
+        task='task {}'.format(index),
+        timestamp=str(index),
+    )
+
+
+def per_event(events):
+    provision = Provision()
+    provision.save()
+    start = time.time()
+    for index in range(events):
+        ProvisionLog.append(provision.id, [make_log(provision, index)])
+    return time.time() - start
+
+
+def batched(events, batch_size):
+    provision = Provision()
+    provision.save()
+    start = time.time()
+    logs = []
+    for index in range(events):
+        logs.append(make_log(provision, index))
+        if len(logs) >= batch_size:
+            ProvisionLog.append(provision.id, logs)
+            logs = []
+    ProvisionLog.append(provision.id, logs)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    connect(
+        host=os.environ.get('MONGODB_HOST', 'localhost'),
+        db='onelovebench',
+    )
+    for name, took in [
+        ('per-event', per_event(events)),
+        ('batched', batched(events, batch_size)),
+    ]:
+        print(
+            '{:<14} {:>8.3f}s {:>10.1f} events/s'.format(
+                name,
+                took,
+                events / took,
+            )
+        )
+    Provision.drop_collection()
+    ProvisionLog.drop_collection()
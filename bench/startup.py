@@ -0,0 +1,48 @@
+"""
+Import and create_app time per process role, each measured in a fresh
+interpreter so no module is already imported.
+
+    python bench/startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+root = os.path.realpath(os.path.join(__file__, '..', '..'))
+
+measure = '''
+import time
+start = time.time()
+import onelove
+from config import configs
+imported = time.time()
+onelove.create_app(configs['testing'], role='{role}')
+print(imported - start, time.time() - imported)
+'''
+
+
+def run(role):
+    output = subprocess.check_output(
+        [sys.executable, '-c', measure.format(role=role)],
+        cwd=root,
+    )
+    imported, created = output.decode('utf-8').split()
+    return float(imported), float(created)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, root)
+    from onelove import process_roles
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('{:<8} {:>10} {:>12}'.format('role', 'import', 'create_app'))
+    for role in process_roles:
+        results = [run(role) for _ in range(runs)]
+        imported = min(result[0] for result in results)
+        created = min(result[1] for result in results)
+        print(
+            '{:<8} {:>8.1f}ms {:>10.1f}ms'.format(
+                role,
+                imported * 1000,
+                created * 1000,
+            )
+        )
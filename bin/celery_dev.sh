@@ -4,6 +4,7 @@
 BIN_DIR=`dirname $0`
 WSGI_MODULE=wsgi
 FLASK_ENV="development"
+export ONELOVE_ROLE="worker"
 
 . ${BIN_DIR}/common.sh
 setup $1
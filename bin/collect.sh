@@ -2,6 +2,7 @@
 
 
 BIN_DIR=`dirname $0`
+export ONELOVE_ROLE="cli"
 . ${BIN_DIR}/common.sh
 setup
 
@@ -3,6 +3,7 @@
 
 export OFFLINE=${OFFLINE:=no}
 BIN_DIR=`dirname $0`
+export ONELOVE_ROLE="cli"
 . ${BIN_DIR}/common.sh
 
 if [ "${OFFLINE}" = "yes" ]; then
@@ -4,6 +4,7 @@
 BIN_DIR=`dirname $0`
 export FLASK_PORT=${FLASK_PORT:=5000}
 export FLASK_ENV="development"
+export ONELOVE_ROLE="web"
 API_ROOT="http://`hostname`:${FLASK_PORT}/doc/swaggerui"
 export OFFLINE=${OFFLINE:=no}
 
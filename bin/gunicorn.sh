@@ -3,6 +3,7 @@
 
 BIN_DIR=`dirname $0`
 FLASK_ENV="production"
+export ONELOVE_ROLE="web"
 NAME=onelove
 NUM_WORKERS=4
 WSGI_MODULE=wsgi
@@ -0,0 +1,12 @@
+#!/bin/sh
+
+
+BIN_DIR=`dirname $0`
+FLASK_ENV="production"
+export ONELOVE_ROLE="relay"
+
+. ${BIN_DIR}/common.sh
+setup
+
+
+exec flask socket relay
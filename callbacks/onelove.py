@@ -1,13 +1,18 @@
 import inspect
 import os
+import queue
 import sys
+import tempfile
+import threading
+import time
 from datetime import datetime
 from json import dumps, loads
 
 from ansible.plugins.callback import CallbackBase
 
-from mongoengine import connect
-from redis import StrictRedis
+from bson import ObjectId
+from mongoengine import connect, disconnect
+from redis import ConnectionPool, StrictRedis
 
 DOCUMENTATION = '''
     name: onelove
@@ -31,44 +36,209 @@ def set_relative_path():
 
 
 class CallbackModule(CallbackBase):
-    def log(self, result, status):
-        provision_id = os.environ.get('PROVISION_ID')
-        data = {
-            'host': result._host.get_name(),
-            'provision_id': provision_id,
-            'log': result._result.get('msg'),
-            'status': status,
-            'task': result._task.get_name(),
-            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S:%f'),
-            'type': 'log',
-        }
-        redis_host = os.environ.get('REDIS_HOST')
-        redis = StrictRedis(host=redis_host)
-        message = dumps(data)
-        redis.publish('ansible', message)
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.provision_id = os.environ.get('PROVISION_ID')
+        self.cluster_id = os.environ.get('CLUSTER_ID')
+        self.redis = None
+        self.mongo = None
+        self.logs = []
+        self.batch_size = int(os.environ.get('LOG_BATCH_SIZE', 100))
+        self.flush_interval = float(os.environ.get('LOG_FLUSH_INTERVAL', 1))
+        self.flushed = time.time()
+        self.overflow = os.environ.get('LOG_QUEUE_OVERFLOW', 'block')
+        self.spill_dir = os.environ.get(
+            'LOG_SPILL_DIR',
+            tempfile.gettempdir(),
+        )
+        self.spill_path = None
+        self.spilled = 0
+        self.max_size = int(os.environ.get('LOG_MAX_SIZE', 65536))
+        self.maxlen = int(os.environ.get('EVENT_STREAM_MAXLEN', 10000))
+        self.codec = os.environ.get('EVENT_CODEC', 'json')
+        self.queue = queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+        self.stop_timeout = float(os.environ.get('LOG_STOP_TIMEOUT', 60))
+        self.writer = None
+
+    def connect(self):
+        """Open redis and mongo connections once per playbook run"""
+        set_relative_path()
+        if self.redis is None:
+            redis_host = os.environ.get('REDIS_HOST')
+            pool = ConnectionPool(host=redis_host)
+            self.redis = StrictRedis(connection_pool=pool)
         mongodb_settings_string = os.environ.get('MONGODB_SETTINGS')
-        if mongodb_settings_string is not None:
-            set_relative_path()
-            from onelove.models.provision import Provision, Log
+        if self.mongo is None and mongodb_settings_string is not None:
             mongodb_settings = loads(mongodb_settings_string)
-            connect(
+            self.mongo = connect(
                 host=mongodb_settings['host'],
                 db=mongodb_settings['db'],
             )
-            provision = Provision.objects.get(id=provision_id)
-            log = Log(
+
+    def disconnect(self):
+        if self.redis is not None:
+            self.redis.connection_pool.disconnect()
+            self.redis = None
+        if self.mongo is not None:
+            disconnect()
+            self.mongo = None
+
+    def flush(self):
+        """Write buffered logs to the provision log collection in bulk"""
+        self.flushed = time.time()
+        logs = self.logs
+        self.logs = []
+        if not logs or self.mongo is None:
+            return
+        from onelove.models.provision import ProvisionLog
+        ProvisionLog.append(self.provision_id, logs)
+
+    def offload(self, data):
+        """Truncate oversized messages, storing the full text as a blob"""
+        text = data['log']
+        if not isinstance(text, str) or len(text) <= self.max_size:
+            return None
+        data['log'] = text[:self.max_size]
+        data['truncated'] = True
+        if self.mongo is None:
+            return None
+        from onelove.models.provision import ProvisionLogBlob
+        blob = ProvisionLogBlob.compress(ObjectId(self.provision_id), text)
+        blob.save()
+        return blob
+
+    def write(self, data):
+        from onelove.events import publish
+        blob = self.offload(data)
+        log_id = None
+        if self.mongo is not None:
+            # assigned before publishing so clients can fetch the log (and
+            # its blob when truncated) by id
+            log_id = ObjectId()
+            data['log_id'] = str(log_id)
+        publish(self.redis, data, self.maxlen, self.codec)
+        if log_id is not None:
+            from onelove.models.provision import ProvisionLog
+            log = ProvisionLog(
+                id=log_id,
+                provision=ObjectId(self.provision_id),
                 host=data['host'],
                 log=data['log'],
                 status=data['status'],
                 task=data['task'],
                 timestamp=data['timestamp'],
+                truncated=data.get('truncated', False),
+                blob=blob,
+            )
+            self.logs.append(log)
+        if len(self.logs) >= self.batch_size:
+            self.flush()
+
+    def unspill(self):
+        if not self.spilled:
+            return
+        with open(self.spill_path) as spill:
+            for line in spill:
+                self.safely(self.write, loads(line))
+        os.remove(self.spill_path)
+        self.spill_path = None
+        self.spilled = 0
+
+    def spill(self, data):
+        """
+        Append an event to this process' own spill file: shards and
+        concurrent playbooks must never replay each other's events
+        """
+        if self.spill_path is None:
+            fd, self.spill_path = tempfile.mkstemp(
+                prefix='onelove-{}-'.format(self.provision_id),
+                suffix='.jsonl',
+                dir=self.spill_dir,
             )
-            provision.logs.append(log)
-            provision.save()
+            os.close(fd)
+        with open(self.spill_path, 'a') as spill:
+            spill.write(dumps(data) + '\n')
+        self.spilled += 1
+
+    def safely(self, method, *args):
+        """Call method, warning instead of killing the writer on errors"""
+        try:
+            method(*args)
+        except Exception as error:
+            self._display.warning(
+                'onelove callback {} failed: {}'.format(
+                    method.__name__,
+                    error,
+                )
+            )
+
+    def run(self):
+        """Writer thread: drain the queue until the stop marker arrives"""
+        self.safely(self.connect)
+        while True:
+            try:
+                data = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                data = False
+            if data is None:
+                break
+            if data:
+                self.safely(self.write, data)
+            if time.time() - self.flushed >= self.flush_interval:
+                self.safely(self.flush)
+        self.safely(self.unspill)
+        self.safely(self.flush)
+        self.safely(self.disconnect)
+
+    def enqueue(self, data):
+        if self.overflow == 'block':
+            self.queue.put(data)
+            return
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            if self.overflow == 'spill':
+                self.spill(data)
+                return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(data)
+
+    def log(self, result, status):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.run, daemon=True)
+            self.writer.start()
+        data = {
+            'host': result._host.get_name(),
+            'provision_id': self.provision_id,
+            'cluster_id': self.cluster_id,
+            'log': result._result.get('msg'),
+            'status': status,
+            'task': result._task.get_name(),
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S:%f'),
+            'type': 'log',
+        }
+        self.enqueue(data)
 
     def v2_playbook_on_handler_task_start(self, result):
         self.log(result, 'start')
 
+    def v2_playbook_on_stats(self, stats):
+        if self.writer is None:
+            return
+        try:
+            self.queue.put(None, timeout=self.stop_timeout)
+        except queue.Full:
+            self._display.warning('onelove callback writer is stuck')
+        self.writer.join(self.stop_timeout)
+        if self.writer.is_alive():
+            self._display.warning(
+                'onelove callback writer did not finish, logs may be lost'
+            )
+        self.writer = None
+
     def v2_runner_on_ok(self, result):
         self.log(result, 'ok')
 
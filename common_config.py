@@ -20,12 +20,49 @@ class Config:
         'db': 'onelove',
     }
     REDIS_HOST = REDIS_HOST
+    LOG_BATCH_SIZE = 100
+    LOG_FLUSH_INTERVAL = 1
+    LOG_QUEUE_SIZE = 10000
+    LOG_QUEUE_OVERFLOW = 'block'  # block, drop or spill
+    LOG_SPILL_DIR = None  # directory of spill files, None is the tmp dir
+    LOG_MAX_SIZE = 65536
+    LOG_STOP_TIMEOUT = 60  # seconds to wait for the callback writer
+    OUTPUT_BATCH_SIZE = 50
+    EVENT_STREAM_MAXLEN = 10000
+    EVENT_STREAM_TTL = 86400
+    SOCKET_WINDOW = 100  # ms, 0 emits every event on its own
+    SOCKET_SUMMARY = True
+    SOCKETIO_MESSAGE_QUEUE = 'redis://{}:6379'.format(REDIS_HOST)
+    # embedded: relay in every process, leader: one elected relay among
+    # processes, external: only `flask socket relay` relays
+    SOCKET_RELAY = 'leader'
+    EVENT_CODEC = 'json'  # json, orjson or msgpack
+    # forward encoded payloads to clients without decoding them
+    SOCKET_RAW = False
     CELERY_LOG_LEVEL = 'INFO'
+    CELERY_CONCURRENCY = 4
+    PROVISION_CLUSTER_CONCURRENCY = 1
+    # renewed while a playbook runs, expires hosts of dead workers only
+    HOST_LEASE_TTL = 21600
+    # directory shared by all workers, None disables the role cache
+    ROLE_CACHE_PATH = None
+    ROLE_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+    PLAYBOOK_CACHE_TTL = 604800
+    # materialised inventory of a provision, must outlive its queue wait
+    # and run
+    INVENTORY_TTL = 86400
+    FACT_CACHE = 'redis'  # redis, jsonfile or None
+    FACT_CACHE_PATH = '/tmp/onelove-facts'  # jsonfile only
+    FACT_CACHE_PREFIX = 'ansible_facts_'
+    FACT_CACHE_TTL = 86400
     CELERY_BROKER_URL = 'redis://{}:6379'.format(REDIS_HOST)
     CELERY_RESULT_BACKEND = 'redis://{}:6379'.format(REDIS_HOST)
     CELERY_TASK_SERIALIZER = 'json'
     CELERY_RESULT_SERIALIZER = 'json'
     CELERY_ACCEPT_CONTENT = ['json']
+    # task modules a worker registers at startup, nothing else imports
+    # them in a worker process
+    CELERY_IMPORTS = ['onelove.tasks.provision', 'onelove.tasks.roles']
     OPENAPI_URL_PREFIX = '/doc'
     OPENAPI_REDOC_PATH = '/redoc'
     OPENAPI_SWAGGER_UI_PATH = '/swaggerui'
@@ -10,3 +10,4 @@ class TestConfig(Config):
     REDIS_HOST = REDIS_HOST
     CELERY_BROKER_URL = 'redis://{}:6379'.format(REDIS_HOST)
     CELERY_RESULT_BACKEND = 'redis://{}:6379'.format(REDIS_HOST)
+    SOCKETIO_MESSAGE_QUEUE = 'redis://{}:6379'.format(REDIS_HOST)
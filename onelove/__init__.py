@@ -1,46 +1,135 @@
 import os
 
 from flask import Flask
-from flask_collect import Collect
-from flask_jwt_extended import JWTManager
-from flask_mongoengine import MongoEngine
-from flask_security import MongoEngineUserDatastore, Security
-from flask_socketio import SocketIO
 
-from .api import create_api
-from .models.auth import Role, User
-from .socket import SocketThread
-from .tasks.celery import make_celery
+process_roles = {
+    'web': [
+        'db',
+        'redis',
+        'security',
+        'celery',
+        'api',
+        'socketio',
+        'jwt',
+        'relay',
+    ],
+    'worker': ['db', 'redis', 'celery'],
+    'relay': ['socketio'],
+    'cli': ['collect', 'db', 'redis', 'security', 'celery', 'socketio'],
+    'all': [
+        'collect',
+        'db',
+        'redis',
+        'security',
+        'celery',
+        'api',
+        'socketio',
+        'jwt',
+        'relay',
+    ],
+}
 
 
-def create_app(config, app=None):
-    class Result(object):
-        def __init__(self, **kwargs):
-            for k, v in kwargs.items():
-                setattr(self, k, v)
+def make_relay(app, leader=False):
+    from .socket import SocketThread
+    return SocketThread(
+        app.socketio,
+        app.config['REDIS_HOST'],
+        window=app.config['SOCKET_WINDOW'],
+        summary=app.config['SOCKET_SUMMARY'],
+        lock='ansible:relay' if leader else None,
+        raw=app.config['SOCKET_RAW'],
+    )
 
-    if app is None:
-        app = Flask(__name__)
-        app.config.from_object(config)
 
+def init_collect(app):
+    from flask_collect import Collect
     app.collect = Collect(app)
-    app.celery = make_celery(app)
+
+
+def init_db(app):
+    from flask_mongoengine import MongoEngine
     app.db = MongoEngine(app)
+
+
+def init_redis(app):
+    from redis import StrictRedis
+    app.redis = StrictRedis(host=app.config['REDIS_HOST'])
+
+
+def init_security(app):
+    from flask_security import MongoEngineUserDatastore, Security
+    from .models.auth import Role, User
     app.user_datastore = MongoEngineUserDatastore(
         app.db,
         User,
         Role,
     )
     app.security = Security(app, app.user_datastore)
+
+
+def init_celery(app):
+    from .tasks.celery import make_celery
+    app.celery = make_celery(app)
+
+
+def init_api(app):
+    from .api import create_api
     create_api(app)
-    app.socketio = SocketIO(app, logger=True)
 
+
+def init_socketio(app):
+    from flask_socketio import SocketIO
+    from .socket import register_handlers
+    app.socketio = SocketIO(
+        app,
+        logger=True,
+        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+    )
+    register_handlers(app.socketio, app.config['REDIS_HOST'])
+
+
+def init_jwt(app):
+    from flask_jwt_extended import JWTManager
     app.jwt = JWTManager(app)
+
+
+def init_relay(app):
     werkzeug = os.environ.get('WERKZEUG_RUN_MAIN', 'true')
-    if werkzeug == 'true':
-        app.socket_thread = SocketThread(
-            app.socketio,
-            app.config['REDIS_HOST']
-        )
+    relay = app.config['SOCKET_RELAY']
+    if werkzeug == 'true' and relay in ['embedded', 'leader']:
+        app.socket_thread = make_relay(app, leader=relay == 'leader')
         app.socket_thread.start()
+
+
+components = {
+    'collect': init_collect,
+    'db': init_db,
+    'redis': init_redis,
+    'security': init_security,
+    'celery': init_celery,
+    'api': init_api,
+    'socketio': init_socketio,
+    'jwt': init_jwt,
+    'relay': init_relay,
+}
+
+
+def create_app(config, app=None, role=None):
+    """
+    Create the app with only the extensions its process role needs: web,
+    worker, relay, cli or all (the default, overridden by ONELOVE_ROLE)
+    """
+    class Result(object):
+        def __init__(self, **kwargs):
+            for k, v in kwargs.items():
+                setattr(self, k, v)
+
+    if app is None:
+        app = Flask(__name__)
+        app.config.from_object(config)
+
+    app.role = role or os.environ.get('ONELOVE_ROLE', 'all')
+    for component in process_roles[app.role]:
+        components[component](app)
     return app
@@ -25,6 +25,7 @@ def create_api(app):
     from .host import blueprint as host
     from .me import blueprint as me
     from .provider import blueprint as provider
+    from .provision import blueprint as provision
     from .service import blueprint as service
     from .user import blueprint as user
 
@@ -37,6 +38,7 @@ def create_api(app):
             cluster,
             me,
             provider,
+            provision,
             service,
             user,
         ],
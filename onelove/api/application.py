@@ -1,12 +1,20 @@
+from flask import current_app
 from flask_rest_api import abort
 
 from ..models.service import Application, Service
+from ..playbooks import invalidate
 from ..schemas.application import ApplicationSchema
 from ..schemas.paging import PageInSchema, PageOutSchema, paginate
 from .methodviews import ProtectedMethodView
 from .service import blueprint
 
 
+def changed(service):
+    from ..tasks.roles import prefetch
+    invalidate(current_app.redis, service.id)
+    prefetch.delay(str(service.id))
+
+
 @blueprint.route('/<service_id>/applications', endpoint='applications')
 class ApplicationListAPI(ProtectedMethodView):
     @blueprint.arguments(PageInSchema(), location='headers')
@@ -30,6 +38,7 @@ class ApplicationListAPI(ProtectedMethodView):
         application = Application(**args)
         service.applications.append(application)
         service.save()
+        changed(service)
         return application
 
 
@@ -63,6 +72,7 @@ class ApplicationAPI(ProtectedMethodView):
                 for arg in args:
                     setattr(app, arg, args[arg])
                 service.save()
+                changed(service)
                 return app
         abort(404, message='No such application')
 
@@ -77,5 +87,6 @@ class ApplicationAPI(ProtectedMethodView):
             if app.name == application_name:
                 service.applications.remove(app)
                 service.save()
+                changed(service)
                 return app
         abort(404, message='No such application')
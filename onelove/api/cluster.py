@@ -1,7 +1,14 @@
+from flask import current_app
 from flask_rest_api import Blueprint, abort
 
-from ..models.cluster import Cluster
-from ..schemas.cluster import ClusterSchema
+from ..facts import invalidate
+from ..models.cluster import Cluster, ClusterHost, ExecutionProfile
+from ..schemas.cluster import (
+    ClusterHostsSchema,
+    ClusterSchema,
+    SelectorSchema
+)
+from ..schemas.facts import FactsSchema
 from ..schemas.paging import PageInSchema, PageOutSchema, paginate
 from .methodviews import ProtectedMethodView
 
@@ -20,6 +27,8 @@ class ClusterListAPI(ProtectedMethodView):
     @blueprint.response(ClusterSchema())
     def post(self, args):
         """Create cluster"""
+        if 'profile' in args:
+            args['profile'] = ExecutionProfile(**args['profile'])
         cluster = Cluster(**args)
         cluster.save()
         return cluster
@@ -45,6 +54,11 @@ class ClusterAPI(ProtectedMethodView):
         except Cluster.DoesNotExist:
             return {'message': 'Cluster not found'}, 404
         cluster.name = args.get('name', cluster.name)
+        cluster.selector = args.get('selector', cluster.selector) or None
+        if cluster.profile is None:
+            cluster.profile = ExecutionProfile()
+        for arg, value in args.get('profile', {}).items():
+            setattr(cluster.profile, arg, value)
         cluster.save()
         return cluster
 
@@ -57,3 +71,46 @@ class ClusterAPI(ProtectedMethodView):
             abort('Cluster not found', 404)
         cluster.delete()
         return cluster
+
+
+@blueprint.route('/<cluster_id>/hosts', endpoint='cluster_hosts')
+class ClusterHostsAPI(ProtectedMethodView):
+    @blueprint.arguments(SelectorSchema(), location='query')
+    @blueprint.response(ClusterHostsSchema())
+    def get(self, args, cluster_id):
+        """Preview hosts selected by the cluster or the given selector"""
+        try:
+            cluster = Cluster.objects.get(id=cluster_id)
+        except Cluster.DoesNotExist:
+            abort(404, message='No such cluster')
+        selector = args.get('selector')
+        if selector:
+            hosts = ClusterHost.preview(cluster, selector)
+        else:
+            selector = cluster.selector
+            hosts = cluster.hosts()
+        return {
+            'selector': selector,
+            'total': len(hosts),
+            'hosts': hosts,
+        }
+
+
+@blueprint.route('/<cluster_id>/facts', endpoint='cluster_facts')
+class ClusterFactsAPI(ProtectedMethodView):
+    @blueprint.response(FactsSchema())
+    def delete(self, cluster_id):
+        """Forget cached facts of cluster hosts"""
+        try:
+            cluster = Cluster.objects.get(id=cluster_id)
+        except Cluster.DoesNotExist:
+            abort(404, message='No such cluster')
+        hostnames = [host.hostname for host in cluster.hosts()]
+        return {
+            'hosts': hostnames,
+            'removed': invalidate(
+                current_app.redis,
+                current_app.config,
+                hostnames,
+            ),
+        }
@@ -1,6 +1,9 @@
+from flask import current_app
 from flask_rest_api import abort
 
+from ..facts import invalidate
 from ..models.provider import HostSSH, Provider
+from ..schemas.facts import FactsSchema
 from ..schemas.host import HostSSHSchema
 from ..schemas.paging import PageInSchema, PageOutSchema, paginate
 from .methodviews import ProtectedMethodView
@@ -76,3 +79,26 @@ class HostAPI(ProtectedMethodView):
                 provider.save()
                 return host
         abort(404, message='No such host')
+
+
+@blueprint.route(
+    '/<provider_id>/host/<host_name>/facts',
+    endpoint='host_facts',
+)
+class HostFactsAPI(ProtectedMethodView):
+    @blueprint.response(FactsSchema())
+    def delete(self, provider_id, host_name):
+        """Forget cached facts of host"""
+        try:
+            provider = Provider.objects.get(id=provider_id)
+        except Provider.DoesNotExist:
+            abort(404, message='No such provider')
+        for host in provider.hosts:
+            if host.hostname == host_name:
+                removed = invalidate(
+                    current_app.redis,
+                    current_app.config,
+                    [host_name],
+                )
+                return {'hosts': [host_name], 'removed': removed}
+        abort(404, message='No such host')
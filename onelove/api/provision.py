@@ -0,0 +1,91 @@
+from flask import Response
+from flask_jwt_extended import get_jwt_identity
+from flask_rest_api import Blueprint, abort
+
+from ..models.auth import User
+from ..models.cluster import Cluster
+from ..models.provision import Provision, ProvisionLog
+from ..models.service import Service
+from ..schemas.paging import PageInSchema, PageOutSchema, paginate
+from ..schemas.provision import (
+    ProvisionLogFilterSchema,
+    ProvisionLogSchema,
+    ProvisionSchema
+)
+from ..tasks.scheduler import request
+from .methodviews import ProtectedMethodView
+
+blueprint = Blueprint('provision', 'provision')
+
+
+@blueprint.route('/', endpoint='provisions')
+class ProvisionListAPI(ProtectedMethodView):
+    @blueprint.arguments(PageInSchema(), location='headers')
+    @blueprint.response(PageOutSchema(ProvisionSchema))
+    def get(self, pagination):
+        """List provisions"""
+        return paginate(Provision.objects.order_by('-id'), pagination)
+
+    @blueprint.arguments(ProvisionSchema())
+    @blueprint.response(ProvisionSchema())
+    def post(self, args):
+        """Request provision"""
+        try:
+            cluster = Cluster.objects.get(id=args['cluster'])
+        except Cluster.DoesNotExist:
+            abort(404, message='No such cluster')
+        try:
+            service = Service.objects.get(id=args['service'])
+        except Service.DoesNotExist:
+            abort(404, message='No such service')
+        user = User.objects(email=get_jwt_identity()).first()
+        return request(
+            cluster,
+            service,
+            user=user,
+            priority=args.get('priority', 'normal'),
+            shards=args.get('shards', 1),
+            incremental=args.get('incremental', False),
+        )
+
+
+@blueprint.route('/<provision_id>', endpoint='provision')
+class ProvisionAPI(ProtectedMethodView):
+    @blueprint.response(ProvisionSchema())
+    def get(self, provision_id):
+        """Get provision details"""
+        try:
+            provision = Provision.objects.get(id=provision_id)
+        except Provision.DoesNotExist:
+            abort(404, message='No such provision')
+        return provision
+
+
+@blueprint.route('/<provision_id>/logs', endpoint='provision_logs')
+class ProvisionLogListAPI(ProtectedMethodView):
+    @blueprint.arguments(ProvisionLogFilterSchema(), location='query')
+    @blueprint.arguments(PageInSchema(), location='headers')
+    @blueprint.response(PageOutSchema(ProvisionLogSchema))
+    def get(self, filters, pagination, provision_id):
+        """List provision logs"""
+        try:
+            provision = Provision.objects.get(id=provision_id)
+        except Provision.DoesNotExist:
+            abort(404, message='No such provision')
+        return paginate(provision.log_entries(**filters), pagination)
+
+
+@blueprint.route(
+    '/<provision_id>/log/<log_id>/blob',
+    endpoint='provision_log_blob',
+)
+class ProvisionLogBlobAPI(ProtectedMethodView):
+    def get(self, provision_id, log_id):
+        """Download full text of a truncated log"""
+        try:
+            log = ProvisionLog.objects.get(id=log_id, provision=provision_id)
+        except ProvisionLog.DoesNotExist:
+            abort(404, message='No such log')
+        if log.blob is None:
+            return Response(log.log or '', mimetype='text/plain')
+        return Response(log.blob.text(), mimetype='text/plain')
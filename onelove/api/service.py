@@ -1,6 +1,8 @@
+from flask import current_app
 from flask_rest_api import Blueprint, abort
 
 from ..models.service import Service
+from ..playbooks import invalidate
 from ..schemas.paging import PageInSchema, PageOutSchema, paginate
 from ..schemas.service import ServiceSchema
 from .methodviews import ProtectedMethodView
@@ -46,6 +48,7 @@ class ServiceAPI(ProtectedMethodView):
             return {'message': 'Service not found'}, 404
         service.name = args.get('name', service.name)
         service.save()
+        invalidate(current_app.redis, service.id)
         return service
 
     @blueprint.response(ServiceSchema())
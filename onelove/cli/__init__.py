@@ -3,25 +3,36 @@ import sys
 from json import dumps
 
 import click
-from celery.bin import worker as w
 from flask.cli import AppGroup
 from flask_security.cli import users
 from onelove.models.auth import User
 
+from .. import inventory
+
 ansible = AppGroup('ansible', short_help='Ansible operations')
 celery = AppGroup('celery', short_help='Manage celery worker')
+socket = AppGroup('socket', short_help='Socket.IO relay')
 
 
 def register(app):
     @celery.command()
     def start():
+        """Start celery worker"""
+        from celery.bin import worker as w
         worker = w.worker(app=app.celery)
         worker.run(
             loglevel=app.config['CELERY_LOG_LEVEL'],
             traceback=True,
             pool_cls='eventlet',
+            concurrency=app.config['CELERY_CONCURRENCY'],
         )
 
+    @socket.command()
+    def relay():
+        """Relay ansible events to Socket.IO clients"""
+        from .. import make_relay
+        make_relay(app, leader=app.config['SOCKET_RELAY'] == 'leader').run()
+
     @ansible.command()
     @click.option('--list', 'list_hosts', help='List hosts', is_flag=True)
     @click.option('--host', help='Details about specified host')
@@ -37,51 +48,55 @@ def register(app):
             sys.stderr.write('PROVISION_ID env var must be set\n')
             exit(1)
 
-        from ..models.provision import Provision
-        try:
-            provision = Provision.objects.get(id=provision_id)
-        except Provision.DoesNotExist:
-            sys.stderr.write('No such provision\n')
-            exit(1)
-        hosts = []
-        for provider in provision.cluster.providers:
-            hosts.extend(provider.list())
-        python_version = os.environ.get('PY_VERSION', '3.6')
-        python_interpreter = '/usr/bin/env python{}'.format(python_version)
+        data = inventory.cached(app.redis, provision_id)
+        if data is None:
+            from ..models.provision import Provision
+            try:
+                provision = Provision.objects.get(id=provision_id)
+            except Provision.DoesNotExist:
+                sys.stderr.write('No such provision\n')
+                exit(1)
+            data = inventory.materialise(
+                app.redis,
+                provision,
+                app.config['INVENTORY_TTL'],
+            )
         if list_hosts:
-            data = {
-                '_meta': {
-                    'hostvars': {},
-                },
-                'all': {
-                    'children': [
-                        'ungrouped',
-                    ],
-                },
-                'ungrouped': {
-                    'hosts': [host.hostname for host in hosts],
-                },
-            }
-            for host in hosts:
-                data['_meta']['hostvars'][host.hostname] = {
-                    'ansible_python_interpreter': python_interpreter,
-                }
-                if host.ip:
-                    device_data = data['_meta']['hostvars'][host.hostname]
-                    device_data['ansible_host'] = host.ip
             print(dumps(data, indent=4))
         else:
-            for host in hosts:
-                if host.hostname == host:
-                    data = {
-                        'ansible_python_interpreter': python_interpreter,
-                    }
-                    if host.ip:
-                        data['ansible_host'] = host.ip
-                    print(dumps(data, indent=4))
-                    return
-            sys.stderr.write('No such host\n')
+            hostvars = data['_meta']['hostvars'].get(host)
+            if hostvars is None:
+                sys.stderr.write('No such host\n')
+                exit(1)
+            print(dumps(hostvars, indent=4))
+
+    @ansible.command()
+    @click.option('--host', 'hostnames', multiple=True, help='Host name')
+    @click.option('--cluster', 'cluster_id', help='Cluster ID')
+    def forget(hostnames, cluster_id):
+        """Forget cached ansible facts"""
+        from ..facts import invalidate
+        from ..models.cluster import Cluster
+        hostnames = list(hostnames)
+        if cluster_id is not None:
+            try:
+                cluster = Cluster.objects.get(id=cluster_id)
+            except Cluster.DoesNotExist:
+                sys.stderr.write('No such cluster\n')
+                exit(1)
+            hostnames.extend(host.hostname for host in cluster.hosts())
+        if not hostnames:
+            sys.stderr.write('At least one --host or --cluster is needed\n')
             exit(1)
+        removed = invalidate(app.redis, app.config, hostnames)
+        print('Removed facts of {} hosts'.format(removed))
+
+    @ansible.command('migrate-logs')
+    def migrate_logs():
+        """Move logs embedded in old provisions to their own collection"""
+        from ..models.provision import ProvisionLog
+        migrated = ProvisionLog.migrate()
+        print('Migrated logs of {} provisions'.format(migrated))
 
     @users.command()
     @click.argument('email')
@@ -107,3 +122,4 @@ def register(app):
 
     app.cli.add_command(ansible)
     app.cli.add_command(celery)
+    app.cli.add_command(socket)
@@ -0,0 +1,58 @@
+import json
+
+
+class JSONCodec(object):
+    name = 'json'
+    binary = False
+
+    def dumps(self, data):
+        return json.dumps(data)
+
+    def loads(self, payload):
+        return json.loads(payload)
+
+
+class ORJSONCodec(object):
+    name = 'orjson'
+    binary = False
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def dumps(self, data):
+        return self.orjson.dumps(data)
+
+    def loads(self, payload):
+        return self.orjson.loads(payload)
+
+
+class MsgpackCodec(object):
+    name = 'msgpack'
+    binary = True
+
+    def __init__(self):
+        import msgpack
+        self.msgpack = msgpack
+
+    def dumps(self, data):
+        return self.msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, payload):
+        return self.msgpack.unpackb(payload, raw=False)
+
+
+codecs = {}
+for codec in [JSONCodec, ORJSONCodec, MsgpackCodec]:
+    codecs[codec.name] = codec
+
+instances = {}
+
+
+def get_codec(name='json'):
+    """Codec instance by name, its library is imported on first use"""
+    if isinstance(name, bytes):
+        name = name.decode('utf-8')
+    if name not in instances:
+        instances[name] = codecs[name]()
+    return instances[name]
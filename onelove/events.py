@@ -0,0 +1,77 @@
+from .codecs import get_codec
+
+streams_key = 'ansible:streams'
+
+
+def stream_name(provision_id):
+    return 'ansible:{}'.format(provision_id)
+
+
+def field(fields, name):
+    value = fields.get(name.encode('utf-8'))
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def decode(event_id, fields):
+    if isinstance(event_id, bytes):
+        event_id = event_id.decode('utf-8')
+    codec = get_codec(field(fields, 'codec') or 'json')
+    data = codec.loads(fields[b'data'])
+    data['id'] = event_id
+    return data
+
+
+def raw(event_id, fields):
+    """
+    Event with its payload left encoded, routed by the stream fields only
+    """
+    if isinstance(event_id, bytes):
+        event_id = event_id.decode('utf-8')
+    codec = get_codec(field(fields, 'codec') or 'json')
+    payload = fields[b'data']
+    if not codec.binary:
+        payload = payload.decode('utf-8')
+    return {
+        'id': event_id,
+        'provision_id': field(fields, 'provision_id'),
+        'cluster_id': field(fields, 'cluster_id'),
+        'codec': codec.name,
+        'data': payload,
+    }
+
+
+def publish(redis, data, maxlen=10000, codec='json'):
+    """Append an event to the capped stream of its provision"""
+    codec = get_codec(codec)
+    stream = stream_name(data['provision_id'])
+    fields = {
+        'codec': codec.name,
+        'data': codec.dumps(data),
+        'provision_id': str(data['provision_id']),
+    }
+    if data.get('cluster_id') is not None:
+        fields['cluster_id'] = str(data['cluster_id'])
+    pipe = redis.pipeline()
+    pipe.xadd(stream, fields, maxlen=maxlen)
+    pipe.sadd(streams_key, stream)
+    return pipe.execute()[0]
+
+
+def close(redis, provision_id, ttl=86400):
+    """Stop relaying a provision stream, keep it for replay for ttl seconds"""
+    stream = stream_name(provision_id)
+    pipe = redis.pipeline()
+    pipe.srem(streams_key, stream)
+    pipe.expire(stream, ttl)
+    pipe.execute()
+
+
+def replay(redis, provision_id, last_id='0-0'):
+    """Events of a provision newer than last_id"""
+    stream = stream_name(provision_id)
+    for event_id, fields in redis.xrange(stream, min=last_id):
+        data = decode(event_id, fields)
+        if data['id'] != last_id:
+            yield data
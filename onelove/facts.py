@@ -0,0 +1,44 @@
+import os
+
+keyset = 'ansible_cache_keys'
+
+
+def environment(config):
+    """Ansible settings for the per host fact cache"""
+    backend = config['FACT_CACHE']
+    if backend is None:
+        return {}
+    if backend == 'redis':
+        connection = '{}:6379:0'.format(config['REDIS_HOST'])
+    else:
+        connection = config['FACT_CACHE_PATH']
+    return {
+        'ANSIBLE_GATHERING': 'smart',
+        'ANSIBLE_CACHE_PLUGIN': backend,
+        'ANSIBLE_CACHE_PLUGIN_CONNECTION': connection,
+        'ANSIBLE_CACHE_PLUGIN_PREFIX': config['FACT_CACHE_PREFIX'],
+        'ANSIBLE_CACHE_PLUGIN_TIMEOUT': str(config['FACT_CACHE_TTL']),
+    }
+
+
+def invalidate(redis, config, hostnames):
+    """Forget cached facts of hosts, returns how many were cached"""
+    backend = config['FACT_CACHE']
+    prefix = config['FACT_CACHE_PREFIX']
+    keys = ['{}{}'.format(prefix, hostname) for hostname in hostnames]
+    if not keys:
+        return 0
+    if backend == 'redis':
+        pipe = redis.pipeline()
+        pipe.delete(*keys)
+        pipe.zrem(keyset, *hostnames)
+        return pipe.execute()[0]
+    if backend == 'jsonfile':
+        removed = 0
+        for key in keys:
+            path = os.path.join(config['FACT_CACHE_PATH'], key)
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        return removed
+    return 0
@@ -0,0 +1,105 @@
+import hashlib
+from json import dumps
+
+from .inventory import hostvars
+from .models.provision import HostState, ProvisionLog
+from .playbooks import service_hash
+
+failed_statuses = ['failed', 'item_failed', 'unreachable']
+
+
+def fingerprint(service_digest, host):
+    """Hash of everything that decides what a provision does to a host"""
+    entry = {
+        'service': service_digest,
+        'host': {
+            'hostname': host.hostname,
+            'ip': host.ip,
+            'tags': sorted(host.tags),
+        },
+        'hostvars': hostvars(host),
+    }
+    return hashlib.sha256(
+        dumps(entry, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def service_digest(service, cache=None):
+    """
+    Service hash, plus the content digests of its cached roles so that a
+    changed role (a new "latest" one too) changes every fingerprint
+    """
+    digest = service_hash(service)
+    if cache is None:
+        return digest
+    roles = {
+        application.galaxy_role: cache.resolved(application.galaxy_role)
+        for application in service.applications
+        if application.galaxy_role
+    }
+    return hashlib.sha256(
+        dumps([digest, roles], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def fingerprints(provision, cache=None):
+    if provision.cluster is None:
+        return {}
+    digest = None
+    if provision.service is not None:
+        digest = service_digest(provision.service, cache)
+    result = {}
+    for host in provision.cluster.hosts():
+        result[host.hostname] = fingerprint(digest, host)
+    return result
+
+
+def plan(provision, cache=None):
+    """
+    Split cluster hosts into the ones to provision and the ones whose
+    fingerprint did not change since their last successful run
+    """
+    current = fingerprints(provision, cache)
+    states = HostState.objects(
+        cluster=provision.cluster,
+        service=provision.service,
+        hostname__in=list(current),
+    )
+    unchanged = set(
+        state.hostname for state in states
+        if state.status == 'SUCCESS' and
+        state.fingerprint == current[state.hostname]
+    )
+    changed = [hostname for hostname in current if hostname not in unchanged]
+    skipped = [hostname for hostname in current if hostname in unchanged]
+    return changed, skipped
+
+
+def record(provision, status, hostnames=None, cache=None):
+    """Remember fingerprints of the hosts a run touched"""
+    current = fingerprints(provision, cache)
+    if hostnames is None:
+        hostnames = list(current)
+    failed = set(
+        ProvisionLog.objects(
+            provision=provision,
+            host__in=hostnames,
+            status__in=failed_statuses,
+        ).distinct('host')
+    )
+    for hostname in hostnames:
+        if hostname not in current:
+            continue
+        host_status = status
+        if hostname in failed:
+            host_status = 'FAILURE'
+        HostState.objects(
+            cluster=provision.cluster,
+            service=provision.service,
+            hostname=hostname,
+        ).update_one(
+            upsert=True,
+            set__fingerprint=current[hostname],
+            set__status=host_status,
+            set__provision=provision,
+        )
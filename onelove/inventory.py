@@ -0,0 +1,119 @@
+import os
+import re
+from json import dumps, loads
+
+
+def python_interpreter():
+    python_version = os.environ.get('PY_VERSION', '3.6')
+    return '/usr/bin/env python{}'.format(python_version)
+
+
+def hostvars(host, interpreter=None):
+    """Ansible variables of an inventory host"""
+    data = {
+        'ansible_python_interpreter': interpreter or python_interpreter(),
+    }
+    if host.ip:
+        data['ansible_host'] = host.ip
+    return data
+
+
+def group_name(kind, name):
+    """
+    Ansible safe group name, prefixed by its kind (tag or provider) so it
+    can never be all, ungrouped or a group of the other kind
+    """
+    return '{}_{}'.format(kind, re.sub(r'[^A-Za-z0-9_]', '_', name))
+
+
+def build(provision, hosts=None):
+    """
+    Ansible inventory of a provision in dynamic inventory format, with a
+    tag_<tag> group per host tag and a provider_<name> group per
+    provider. Hosts default to the cluster hosts, the same hosts the
+    scheduler leases.
+    """
+    interpreter = python_interpreter()
+    groups = {}
+    meta = {}
+    ungrouped = []
+    names = {}
+    if provision.cluster is not None:
+        names = {
+            provider.id: provider.name
+            for provider in provision.cluster.providers
+        }
+        if hosts is None:
+            hosts = provision.cluster.hosts()
+    for host in hosts or []:
+        meta[host.hostname] = hostvars(host, interpreter)
+        # raw reference, so listing hosts does not load their providers
+        provider = host._data.get('provider')
+        name = names.get(getattr(provider, 'id', provider))
+        if name is not None:
+            groups.setdefault(
+                group_name('provider', name),
+                [],
+            ).append(host.hostname)
+        if not host.tags:
+            ungrouped.append(host.hostname)
+        for tag in host.tags:
+            groups.setdefault(
+                group_name('tag', tag),
+                [],
+            ).append(host.hostname)
+    groups['ungrouped'] = ungrouped
+    data = {
+        '_meta': {
+            'hostvars': meta,
+        },
+        'all': {
+            'children': sorted(groups),
+        },
+    }
+    for name, hostnames in groups.items():
+        data[name] = {
+            'hosts': hostnames,
+        }
+    return data
+
+
+def static(data):
+    """Dynamic inventory data in the layout of a static inventory file"""
+    children = {}
+    for name in data['all']['children']:
+        children[name] = {
+            'hosts': {hostname: {} for hostname in data[name]['hosts']},
+        }
+    return {
+        'all': {
+            'hosts': data['_meta']['hostvars'],
+            'children': children,
+        },
+    }
+
+
+def inventory_name(provision_id):
+    return 'inventory:{}'.format(provision_id)
+
+
+def materialise(redis, provision, ttl=86400):
+    """Render the inventory of a provision once and keep it in redis"""
+    data = build(provision)
+    redis.set(inventory_name(provision.id), dumps(data), ex=ttl)
+    return data
+
+
+def cached(redis, provision_id):
+    value = redis.get(inventory_name(provision_id))
+    if value is None:
+        return None
+    return loads(value)
+
+
+def write(data, path):
+    """Write a static inventory file ansible reads without any plugin"""
+    filename = os.path.join(path, 'inventory.json')
+    with open(filename, 'w') as f:
+        f.write(dumps(static(data)))
+    return filename
@@ -0,0 +1,71 @@
+acquire_script = '''
+for _, key in ipairs(KEYS) do
+    local owner = redis.call('get', key)
+    if owner and owner ~= ARGV[1] then
+        return 0
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('set', key, ARGV[1], 'EX', ARGV[2])
+    redis.call('sadd', ARGV[3], key)
+end
+redis.call('expire', ARGV[3], ARGV[2])
+return 1
+'''
+
+release_script = '''
+for _, key in ipairs(redis.call('smembers', KEYS[1])) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('del', key)
+    end
+end
+redis.call('del', KEYS[1])
+return 1
+'''
+
+renew_script = '''
+for _, key in ipairs(redis.call('smembers', KEYS[1])) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('expire', key, ARGV[2])
+    end
+end
+redis.call('expire', KEYS[1], ARGV[2])
+return 1
+'''
+
+
+def lease_name(hostname):
+    return 'lease:host:{}'.format(hostname)
+
+
+def leases_name(provision_id):
+    return 'lease:provision:{}'.format(provision_id)
+
+
+def acquire(redis, provision_id, hostnames, ttl=21600):
+    """
+    Lease every host to the provision, or none of them if any is leased
+    to another provision
+    """
+    script = redis.register_script(acquire_script)
+    keys = [lease_name(hostname) for hostname in hostnames]
+    args = [str(provision_id), ttl, leases_name(provision_id)]
+    return bool(script(keys=keys, args=args))
+
+
+def release(redis, provision_id):
+    script = redis.register_script(release_script)
+    script(keys=[leases_name(provision_id)], args=[str(provision_id)])
+
+
+def renew(redis, provision_id, ttl=21600):
+    """Extend the leases a provision still holds by ttl seconds"""
+    script = redis.register_script(renew_script)
+    script(keys=[leases_name(provision_id)], args=[str(provision_id), ttl])
+
+
+def owner(redis, hostname):
+    value = redis.get(lease_name(hostname))
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
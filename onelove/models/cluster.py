@@ -1,10 +1,177 @@
 from flask_mongoengine import Document
-from mongoengine.fields import ListField, ReferenceField, StringField
+from mongoengine.fields import (
+    BooleanField,
+    EmbeddedDocument,
+    EmbeddedDocumentField,
+    IntField,
+    ListField,
+    ReferenceField,
+    StringField
+)
+from pymongo import DeleteMany, UpdateOne
 
+from ..selector import compile_selector, select
 from .auth import Role
 from .provider import Provider
 from .service import Service
 
+strategies = ['linear', 'free', 'host_pinned']
+
+ssh_common_args = '-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null'
+
+
+class ExecutionProfile(EmbeddedDocument):
+    forks = IntField(default=5, min_value=1)
+    strategy = StringField(default='linear', choices=strategies)
+    pipelining = BooleanField(default=False)
+    control_persist = IntField(default=60, min_value=0)
+    timeout = IntField(default=10, min_value=1)
+
+    def __repr__(self):
+        return '<ExecutionProfile forks={} strategy={}>'.format(
+            self.forks,
+            self.strategy,
+        )
+
+    def arguments(self):
+        return [
+            '--forks',
+            str(self.forks),
+            '--timeout',
+            str(self.timeout),
+            '--ssh-common-args',
+            ssh_common_args,
+        ]
+
+    def environment(self):
+        if self.control_persist:
+            ssh_args = '-C -o ControlMaster=auto -o ControlPersist={}s'.format(
+                self.control_persist,
+            )
+        else:
+            ssh_args = '-C -o ControlMaster=no'
+        return {
+            'ANSIBLE_STRATEGY': self.strategy,
+            'ANSIBLE_PIPELINING': str(self.pipelining),
+            'ANSIBLE_SSH_ARGS': ssh_args,
+        }
+
+
+class ClusterHost(Document):
+    """
+    Materialised host of a cluster: a host of one of its providers that
+    matches the cluster selector or, without one, has one of its tags
+    """
+    cluster = ReferenceField('Cluster')
+    provider = ReferenceField(Provider)
+    hostname = StringField(max_length=256)
+    ip = StringField(max_length=256)
+    tags = ListField(StringField(), default=[])
+    meta = {
+        'indexes': [
+            {
+                'fields': ('cluster', 'provider', 'hostname'),
+                'unique': True,
+            },
+            ('provider', 'hostname'),
+            'tags',
+        ],
+    }
+
+    def __repr__(self):
+        return '<ClusterHost %r>' % self.hostname
+
+    @classmethod
+    def apply(cls, hosts, **scope):
+        """
+        Make the rows matching scope exactly hosts: upsert new and changed
+        rows and delete stale ones, so readers never see a partial view
+        """
+        collection = cls._get_collection()
+        existing = {}
+        for row in collection.find(cls.objects(**scope)._query):
+            key = (row.get('cluster'), row.get('provider'), row['hostname'])
+            existing[key] = row
+        operations = []
+        for host in hosts:
+            document = host.to_mongo()
+            key = (
+                document.get('cluster'),
+                document.get('provider'),
+                document['hostname'],
+            )
+            values = {
+                'ip': document.get('ip'),
+                'tags': document.get('tags', []),
+            }
+            row = existing.pop(key, None)
+            if row is not None and values == {
+                'ip': row.get('ip'),
+                'tags': row.get('tags', []),
+            }:
+                continue
+            operations.append(
+                UpdateOne(
+                    dict(zip(['cluster', 'provider', 'hostname'], key)),
+                    {'$set': values},
+                    upsert=True,
+                )
+            )
+        if existing:
+            stale = [row['_id'] for row in existing.values()]
+            operations.append(DeleteMany({'_id': {'$in': stale}}))
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+    @classmethod
+    def build(cls, cluster, provider):
+        if cluster.selector:
+            selector = compile_selector(cluster.selector)
+            hosts = [
+                host for host in provider.list()
+                if selector.match(host, provider.name)
+            ]
+        else:
+            tags = set(cluster.tags)
+            hosts = [
+                host for host in provider.list()
+                if tags.intersection(host.tags)
+            ]
+        return [
+            cls(
+                cluster=cluster,
+                provider=provider,
+                hostname=host.hostname,
+                ip=host.ip,
+                tags=host.tags,
+            ) for host in hosts
+        ]
+
+    @classmethod
+    def preview(cls, cluster, text):
+        """Unsaved hosts of the cluster providers selected by text"""
+        return [
+            cls(
+                cluster=cluster,
+                provider=provider_id,
+                hostname=host.get('hostname'),
+                ip=host.get('ip'),
+                tags=host.get('tags', []),
+            ) for provider_id, host in select(cluster.providers, text)
+        ]
+
+    @classmethod
+    def sync_provider(cls, provider):
+        """Refresh the hosts of a provider in every cluster using it"""
+        hosts = []
+        for cluster in Cluster.objects(providers=provider):
+            hosts.extend(cls.build(cluster, provider))
+        cls.apply(hosts, provider=provider)
+
+    @classmethod
+    def remove_provider(cls, provider):
+        cls.objects(provider=provider).delete()
+
 
 class Cluster(Document):
     name = StringField(max_length=512, blank=False)
@@ -14,12 +181,46 @@ class Cluster(Document):
     roles = ListField(ReferenceField(Role), default=[])
     services = ListField(ReferenceField(Service), default=[])
     tags = ListField(StringField(), default=[])
+    selector = StringField()
+    profile = EmbeddedDocumentField(
+        ExecutionProfile,
+        default=ExecutionProfile,
+    )
+    materialised = BooleanField(default=False)
+    meta = {'indexes': ['providers']}
 
     def __repr__(self):
         return '<Cluster %r>' % self.name
 
-    def hosts(self):
-        result = []
-        for provider in self.providers:
-            result.extend(provider.host_by_tag(self.tags))
+    def save(self, *args, **kwargs):
+        changed = set(
+            field.split('.')[0] for field in self._get_changed_fields()
+        )
+        refresh = self._created or bool(
+            changed & {'tags', 'selector', 'providers'}
+        )
+        result = super(Cluster, self).save(*args, **kwargs)
+        if refresh:
+            self.refresh_hosts()
         return result
+
+    def delete(self, *args, **kwargs):
+        ClusterHost.objects(cluster=self).delete()
+        return super(Cluster, self).delete(*args, **kwargs)
+
+    def refresh_hosts(self):
+        """Rebuild the materialised hosts of this cluster"""
+        if self.selector:
+            hosts = ClusterHost.preview(self, self.selector)
+        else:
+            hosts = []
+            for provider in self.providers:
+                hosts.extend(ClusterHost.build(self, provider))
+        ClusterHost.apply(hosts, cluster=self)
+        Cluster.objects(id=self.id).update_one(set__materialised=True)
+        self.materialised = True
+
+    def hosts(self):
+        if not self.materialised:
+            self.refresh_hosts()
+        return list(ClusterHost.objects(cluster=self))
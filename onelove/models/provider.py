@@ -75,6 +75,22 @@ class Provider(Document):
         super(Provider, self).__init__(*args, **kwargs)
         self._setup()
 
+    def save(self, *args, **kwargs):
+        changed = set(
+            field.split('.')[0] for field in self._get_changed_fields()
+        )
+        result = super(Provider, self).save(*args, **kwargs)
+        # the name matters to provider: terms of cluster selectors
+        if changed & {'hosts', 'name'}:
+            from .cluster import ClusterHost
+            ClusterHost.sync_provider(self)
+        return result
+
+    def delete(self, *args, **kwargs):
+        from .cluster import ClusterHost
+        ClusterHost.remove_provider(self)
+        return super(Provider, self).delete(*args, **kwargs)
+
     def __repr__(self):
         return '<Provider %r>' % self.name
 
@@ -97,6 +113,7 @@ class HostSSH(EmbeddedDocument):
 class ProviderSSH(Provider):
     type = 'SSH'
     hosts = EmbeddedDocumentListField(HostSSH)
+    meta = {'indexes': ['hosts.tags', 'hosts.hostname']}
 
     def list(self):
         return self.hosts
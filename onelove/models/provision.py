@@ -1,7 +1,11 @@
+import zlib
+
 from flask_mongoengine import Document
 from mongoengine.fields import (
-    EmbeddedDocument,
-    EmbeddedDocumentField,
+    BinaryField,
+    BooleanField,
+    DictField,
+    IntField,
     ListField,
     ReferenceField,
     StringField
@@ -12,20 +16,130 @@ from .cluster import Cluster
 from .service import Service
 
 
-class Log(EmbeddedDocument):
+class Provision(Document):
+    cluster = ReferenceField(Cluster)
+    service = ReferenceField(Service)
+    status = StringField(max_length=63, default='PENDING')
+    user = ReferenceField(User)
+    log_count = IntField(default=0)
+    stats = DictField(default={})
+    shards = IntField(default=1)
+    shard_status = DictField(default={})
+    priority = IntField(default=5)
+    args = ListField(StringField(), default=[])
+    incremental = BooleanField(default=False)
+    skipped = ListField(StringField(), default=[])
+    profile = DictField(default={})
+    meta = {
+        'indexes': [
+            ('status', '-priority'),
+            ('cluster', 'service', 'status'),
+        ],
+        # provisions saved before logs moved to ProvisionLog still embed
+        # them until `flask ansible migrate-logs` runs
+        'strict': False,
+    }
+
+    def log_entries(self, **kwargs):
+        return ProvisionLog.objects(provision=self, **kwargs).order_by(
+            'timestamp'
+        )
+
+
+class ProvisionLogBlob(Document):
+    provision = ReferenceField(Provision)
+    size = IntField()
+    data = BinaryField()
+    meta = {'indexes': ['provision']}
+
+    @classmethod
+    def compress(cls, provision, text):
+        raw = text.encode('utf-8')
+        return cls(provision=provision, size=len(raw), data=zlib.compress(raw))
+
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8')
+
+
+class ProvisionLog(Document):
+    provision = ReferenceField(Provision)
     status = StringField(default=None)
     host = StringField(default=None)
     task = StringField(default=None)
     timestamp = StringField(default=None)
     log = StringField(default=None)
+    truncated = BooleanField(default=False)
+    blob = ReferenceField(ProvisionLogBlob)
+    meta = {
+        'indexes': [
+            ('provision', 'timestamp'),
+            ('provision', 'host', 'status'),
+        ],
+    }
 
+    @classmethod
+    def append(cls, provision_id, logs):
+        """
+        Bulk insert logs and bump summary counters on the provision
+        """
+        if not logs:
+            return
+        cls.objects.insert(logs, load_bulk=False)
+        counters = {'log_count': len(logs)}
+        for log in logs:
+            key = 'stats.{}'.format(log.status)
+            counters[key] = counters.get(key, 0) + 1
+        Provision.objects(id=provision_id).update_one(
+            __raw__={'$inc': counters},
+        )
 
-class Provision(Document):
+    @classmethod
+    def migrate(cls):
+        """
+        Move logs embedded in old provisions into ProvisionLog, returning
+        the number of migrated provisions
+        """
+        collection = Provision._get_collection()
+        migrated = 0
+        query = {'logs': {'$exists': True}}
+        for document in collection.find(query, {'logs': 1}):
+            logs = [
+                cls(
+                    provision=document['_id'],
+                    status=log.get('status'),
+                    host=log.get('host'),
+                    task=log.get('task'),
+                    timestamp=log.get('timestamp'),
+                    log=log.get('log'),
+                ) for log in document['logs']
+            ]
+            cls.append(document['_id'], logs)
+            collection.update_one(
+                {'_id': document['_id']},
+                {'$unset': {'logs': ''}},
+            )
+            migrated += 1
+        return migrated
+
+
+class HostState(Document):
+    """
+    Fingerprint of what was last provisioned on a host of a cluster
+    """
     cluster = ReferenceField(Cluster)
-    logs = ListField(EmbeddedDocumentField(Log), default=[])
     service = ReferenceField(Service)
-    status = StringField(max_length=63, default='PENDING')
-    user = ReferenceField(User)
+    hostname = StringField(max_length=256)
+    fingerprint = StringField(max_length=64)
+    status = StringField(max_length=63)
+    provision = ReferenceField(Provision)
+    meta = {
+        'indexes': [
+            {
+                'fields': ('cluster', 'service', 'hostname'),
+                'unique': True,
+            },
+        ],
+    }
 
 
 class Option(object):
@@ -0,0 +1,84 @@
+import hashlib
+import os
+from json import dumps, loads
+
+from .roles import split
+
+template_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'templates',
+    'site.yml.tpl',
+)
+
+
+def service_hash(service):
+    """Content hash of everything a service playbook is generated from"""
+    definition = {
+        'name': service.name,
+        'applications': [
+            [application.name, application.galaxy_role]
+            for application in service.applications
+        ],
+    }
+    return hashlib.sha256(
+        dumps(definition, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def render(service, template=template_path):
+    """Playbook and role requirements of a service"""
+    roles = []
+    requirements = []
+    for application in service.applications:
+        if not application.galaxy_role:
+            continue
+        name, version = split(application.galaxy_role)
+        roles.append('    - {}'.format(name))
+        requirement = '- src: {}'.format(name)
+        if version != 'latest':
+            requirement += '\n  version: {}'.format(version)
+        requirements.append(requirement)
+    with open(template) as f:
+        playbook = f.read()
+    playbook = playbook.replace('SERVICE', service.name)
+    playbook = playbook.replace('ROLES', '\n'.join(roles))
+    return {
+        'playbook': playbook,
+        'requirements': '---\n{}\n'.format('\n'.join(requirements)),
+    }
+
+
+def compiled(redis, service, ttl=604800):
+    """Rendered playbook of a service, generated once per content hash"""
+    digest = service_hash(service)
+    key = 'playbook:{}'.format(digest)
+    cached = redis.get(key)
+    if cached is not None:
+        return loads(cached)
+    result = render(service)
+    pipe = redis.pipeline()
+    pipe.set(key, dumps(result), ex=ttl)
+    pipe.set('playbook:service:{}'.format(service.id), digest, ex=ttl)
+    pipe.execute()
+    return result
+
+
+def invalidate(redis, service_id):
+    """Drop the compiled playbook of a service after it changed"""
+    pointer = 'playbook:service:{}'.format(service_id)
+    digest = redis.get(pointer)
+    if digest is None:
+        return
+    if isinstance(digest, bytes):
+        digest = digest.decode('utf-8')
+    redis.delete(pointer, 'playbook:{}'.format(digest))
+
+
+def write(result, path):
+    """Write a compiled playbook into path, returns the playbook file"""
+    playbook = os.path.join(path, 'site.yml')
+    with open(playbook, 'w') as f:
+        f.write(result['playbook'])
+    with open(os.path.join(path, 'requirements.yml'), 'w') as f:
+        f.write(result['requirements'])
+    return playbook
@@ -0,0 +1,166 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import eventlet
+from eventlet import tpool
+from eventlet.green import subprocess
+
+# written by ansible-galaxy with the install date, so not part of content
+ignored = [os.path.join('meta', '.galaxy_install_info')]
+
+
+def split(galaxy_role):
+    """'name,version' as used by ansible-galaxy into (name, version)"""
+    name, _, version = galaxy_role.partition(',')
+    return name.strip(), version.strip() or 'latest'
+
+
+def key(galaxy_role):
+    name, version = split(galaxy_role)
+    return '{}@{}'.format(name, version).replace('/', '_')
+
+
+def digest(path):
+    """Content hash of a directory tree"""
+    sha = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            filename = os.path.join(root, name)
+            relpath = os.path.relpath(filename, path)
+            if relpath in ignored:
+                continue
+            sha.update(relpath.encode('utf-8'))
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    sha.update(chunk)
+    return sha.hexdigest()
+
+
+def size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class RoleCache(object):
+    """
+    Galaxy roles shared by all workers: refs/<name>@<version> links to
+    objects/<content hash>. Least recently used refs are evicted when the
+    cache grows over its disk budget, but never ones used within min_age
+    seconds as a running provision may still read them.
+    """
+    def __init__(self, path, budget=None, min_age=21600, poll=0.1):
+        self.path = path
+        self.budget = budget
+        self.min_age = min_age
+        self.poll = poll
+        self.refs = os.path.join(path, 'refs')
+        self.objects = os.path.join(path, 'objects')
+        os.makedirs(self.refs, exist_ok=True)
+        os.makedirs(self.objects, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        """
+        Exclusive lock of the cache among workers, polled without blocking
+        so other green threads of the worker keep running meanwhile
+        """
+        with open(os.path.join(self.path, '.lock'), 'w') as lock:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    eventlet.sleep(self.poll)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def ref(self, galaxy_role):
+        return os.path.join(self.refs, key(galaxy_role))
+
+    def install(self, galaxy_role):
+        name, version = split(galaxy_role)
+        source = name if version == 'latest' else '{},{}'.format(
+            name,
+            version,
+        )
+        workdir = tempfile.mkdtemp(dir=self.path)
+        try:
+            subprocess.check_call(
+                ['ansible-galaxy', 'install', '-p', workdir, source],
+            )
+            installed = os.path.join(workdir, name)
+            target = os.path.join(
+                self.objects,
+                tpool.execute(digest, installed),
+            )
+            if not os.path.exists(target):
+                os.rename(installed, target)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        ref = self.ref(galaxy_role)
+        if os.path.lexists(ref):
+            os.remove(ref)
+        os.symlink(os.path.relpath(target, self.refs), ref)
+
+    def get(self, galaxy_role):
+        """Path of the cached role, installing it on a miss"""
+        ref = self.ref(galaxy_role)
+        with self.lock():
+            if not os.path.exists(ref):
+                self.install(galaxy_role)
+                tpool.execute(self.evict)
+            os.utime(ref, follow_symlinks=False)
+        return os.path.realpath(ref)
+
+    def resolved(self, galaxy_role):
+        """Content digest of a cached role, None when it is not cached"""
+        ref = self.ref(galaxy_role)
+        if not os.path.exists(ref):
+            return None
+        return os.path.basename(os.path.realpath(ref))
+
+    def prefetch(self, galaxy_roles):
+        for galaxy_role in galaxy_roles:
+            self.get(galaxy_role)
+
+    def link(self, galaxy_roles, roles_path):
+        """Symlink cached roles into an ansible roles path"""
+        for galaxy_role in galaxy_roles:
+            name, version = split(galaxy_role)
+            os.symlink(self.get(galaxy_role), os.path.join(roles_path, name))
+
+    def evict(self):
+        if self.budget is None:
+            return
+        refs = []
+        for name in os.listdir(self.refs):
+            ref = os.path.join(self.refs, name)
+            refs.append((os.lstat(ref).st_mtime, ref))
+        sizes = {}
+        for name in os.listdir(self.objects):
+            sizes[name] = size(os.path.join(self.objects, name))
+        total = sum(sizes.values())
+        recent = time.time() - self.min_age
+        for used_at, ref in sorted(refs):
+            if total <= self.budget or used_at > recent:
+                break
+            target = os.path.basename(os.path.realpath(ref))
+            os.remove(ref)
+            used = [
+                os.path.basename(os.path.realpath(os.path.join(self.refs, r)))
+                for r in os.listdir(self.refs)
+            ]
+            if target in sizes and target not in used:
+                shutil.rmtree(os.path.join(self.objects, target))
+                total -= sizes.pop(target)
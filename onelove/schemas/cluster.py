@@ -1,8 +1,73 @@
-from marshmallow import fields
+from marshmallow import ValidationError, fields, validate
 
+from ..models.cluster import strategies
+from ..selector import SelectorError, compile_selector
 from .base import BaseSchema
 
 
+def validate_selector(text):
+    try:
+        compile_selector(text)
+    except SelectorError as error:
+        raise ValidationError(str(error))
+
+
+class ExecutionProfileSchema(BaseSchema):
+    forks = fields.Integer(
+        validate=validate.Range(min=1),
+        description='Parallel ansible processes',
+    )
+    strategy = fields.String(
+        validate=validate.OneOf(strategies),
+        description='Ansible strategy',
+    )
+    pipelining = fields.Boolean(description='SSH pipelining')
+    control_persist = fields.Integer(
+        validate=validate.Range(min=0),
+        description='Seconds to keep SSH master connections, 0 disables',
+    )
+    timeout = fields.Integer(
+        validate=validate.Range(min=1),
+        description='SSH connection timeout',
+    )
+
+
 class ClusterSchema(BaseSchema):
     id = fields.String(description='ID', dump_only=True)
     name = fields.String(required=True, description='name')
+    selector = fields.String(
+        validate=validate_selector,
+        allow_none=True,
+        description='Host selector, like "tag:web and not host:*-staging"',
+    )
+    profile = fields.Nested(
+        ExecutionProfileSchema,
+        description='Ansible execution profile',
+    )
+
+
+class SelectorSchema(BaseSchema):
+    selector = fields.String(
+        validate=validate_selector,
+        description='Selector to preview instead of the cluster one',
+    )
+
+
+def provider_id(host):
+    # the raw reference: dereferencing would load a provider per host
+    provider = host._data.get('provider')
+    provider = getattr(provider, 'id', provider)
+    return None if provider is None else str(provider)
+
+
+class ClusterHostSchema(BaseSchema):
+    hostname = fields.String(description='hostname')
+    ip = fields.String(description='IP Address')
+    tags = fields.List(fields.String(), description='Host tags')
+    provider = fields.Function(provider_id, description='Provider ID')
+
+
+class ClusterHostsSchema(BaseSchema):
+    selector = fields.String(description='Selector used')
+    total = fields.Integer()
+    hosts = fields.Nested(ClusterHostSchema, many=True)
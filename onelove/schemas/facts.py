@@ -0,0 +1,8 @@
+from marshmallow import fields
+
+from .base import BaseSchema
+
+
+class FactsSchema(BaseSchema):
+    hosts = fields.List(fields.String(), description='Hosts')
+    removed = fields.Integer(description='Number of cached facts removed')
@@ -0,0 +1,68 @@
+from marshmallow import fields, validate
+
+from ..tasks.scheduler import max_shards, priorities
+from .base import BaseSchema
+
+
+def reference_id(name):
+    def serialize(provision):
+        document = getattr(provision, name)
+        return None if document is None else str(document.id)
+    return serialize
+
+
+class ProvisionSchema(BaseSchema):
+    id = fields.String(description='ID', dump_only=True)
+    cluster = fields.Function(
+        reference_id('cluster'),
+        deserialize=str,
+        required=True,
+        description='Cluster ID',
+    )
+    service = fields.Function(
+        reference_id('service'),
+        deserialize=str,
+        required=True,
+        description='Service ID',
+    )
+    priority = fields.String(
+        load_only=True,
+        validate=validate.OneOf(list(priorities)),
+        description='Priority',
+    )
+    shards = fields.Integer(
+        validate=validate.Range(min=1, max=max_shards),
+        description='Number of host batches',
+    )
+    incremental = fields.Boolean(
+        description='Only provision hosts that changed or failed',
+    )
+    skipped = fields.List(
+        fields.String(),
+        dump_only=True,
+        description='Hosts skipped by an incremental provision',
+    )
+    status = fields.String(dump_only=True, description='Status')
+    log_count = fields.Integer(dump_only=True, description='Number of logs')
+    stats = fields.Dict(dump_only=True, description='Logs per status')
+    profile = fields.Dict(
+        dump_only=True,
+        description='Execution profile the provision ran with',
+    )
+
+
+class ProvisionLogSchema(BaseSchema):
+    id = fields.String(description='ID', dump_only=True)
+    host = fields.String(description='Host')
+    task = fields.String(description='Task')
+    status = fields.String(description='Status')
+    timestamp = fields.String(description='Timestamp')
+    log = fields.String(description='Message, cut when truncated')
+    truncated = fields.Boolean(
+        description='Full message is at /provision/<id>/log/<log_id>/blob',
+    )
+
+
+class ProvisionLogFilterSchema(BaseSchema):
+    host = fields.String(description='Only logs of this host')
+    status = fields.String(description='Only logs of this status')
@@ -0,0 +1,178 @@
+"""
+Boolean host selector of a cluster, for example:
+
+    (tag:web or tag:api) and not host:*-staging and provider:dc1
+
+A bare word is a tag. Hostnames take * and ? globs.
+"""
+import re
+from functools import lru_cache
+
+token_re = re.compile(r'\(|\)|[^\s()]+')
+kinds = ['tag', 'host', 'provider']
+
+
+class SelectorError(ValueError):
+    pass
+
+
+def glob(pattern):
+    """Anchored regular expression of a hostname glob"""
+    result = ['^']
+    for char in pattern:
+        if char == '*':
+            result.append('.*')
+        elif char == '?':
+            result.append('.')
+        else:
+            result.append(re.escape(char))
+    result.append('$')
+    return ''.join(result)
+
+
+class Parser(object):
+    def __init__(self, text):
+        self.tokens = token_re.findall(text)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise SelectorError('Unexpected end of selector')
+        self.position += 1
+        return token
+
+    def operator(self, name):
+        token = self.peek()
+        return token is not None and token.lower() == name
+
+    def parse(self):
+        if not self.tokens:
+            raise SelectorError('Empty selector')
+        tree = self.parse_or()
+        if self.peek() is not None:
+            raise SelectorError('Unexpected {!r}'.format(self.peek()))
+        return tree
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.operator('or'):
+            self.next()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.operator('and'):
+            self.next()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_not(self):
+        if self.operator('not'):
+            self.next()
+            return ('not', self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.next()
+        if token == '(':
+            tree = self.parse_or()
+            if self.next() != ')':
+                raise SelectorError('Missing )')
+            return tree
+        if token == ')' or token.lower() in ['and', 'or', 'not']:
+            raise SelectorError('Unexpected {!r}'.format(token))
+        kind, _, value = token.partition(':')
+        if not value:
+            return ('tag', token)
+        if kind not in kinds:
+            raise SelectorError('Unknown term {!r}'.format(kind))
+        if kind == 'host':
+            return ('host', re.compile(glob(value)))
+        return (kind, value)
+
+
+class Selector(object):
+    def __init__(self, text):
+        self.text = text
+        self.tree = Parser(text).parse()
+
+    def __repr__(self):
+        return '<Selector %r>' % self.text
+
+    def match(self, host, provider_name=None, tree=None):
+        """Whether a host of the named provider is selected"""
+        kind, value = tree or self.tree
+        if kind == 'tag':
+            return value in host.tags
+        if kind == 'host':
+            return value.match(host.hostname or '') is not None
+        if kind == 'provider':
+            return value == provider_name
+        if kind == 'not':
+            return not self.match(host, provider_name, value)
+        if kind == 'and':
+            return all(self.match(host, provider_name, v) for v in value)
+        return any(self.match(host, provider_name, v) for v in value)
+
+    def query(self, prefix='hosts.', tree=None):
+        """
+        Mongo query of the selector over unwound provider hosts, tags and
+        hostnames under prefix and the provider name at the top level
+        """
+        kind, value = tree or self.tree
+        if kind == 'tag':
+            return {prefix + 'tags': value}
+        if kind == 'host':
+            return {prefix + 'hostname': {'$regex': value.pattern}}
+        if kind == 'provider':
+            return {'name': value}
+        if kind == 'not':
+            return {'$nor': [self.query(prefix, value)]}
+        return {
+            '${}'.format(kind): [self.query(prefix, v) for v in value],
+        }
+
+    def negated(self, tree=None):
+        kind, value = tree or self.tree
+        if kind == 'not':
+            return True
+        if kind in ['and', 'or']:
+            return any(self.negated(v) for v in value)
+        return False
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(text):
+    """Parsed selector, cached by its text"""
+    return Selector(text)
+
+
+def select(providers, text):
+    """
+    Hosts of the providers selected by text, filtered by mongo. Returns
+    (provider id, host) pairs where host is the raw host document.
+    """
+    from .models.provider import Provider
+    selector = compile_selector(text)
+    query = selector.query()
+    match = {'_id': {'$in': [provider.id for provider in providers]}}
+    if not selector.negated():
+        # without negation a provider matching the query as a whole is a
+        # superset of one with a matching host, so the multikey index on
+        # hosts.tags can narrow providers before unwinding
+        match = {'$and': [match, query]}
+    pipeline = [
+        {'$match': match},
+        {'$unwind': '$hosts'},
+        {'$match': query},
+        {'$project': {'hosts': 1}},
+    ]
+    for document in Provider.objects.aggregate(*pipeline):
+        yield document['_id'], document['hosts']
@@ -1,24 +1,215 @@
 import threading
-from json import loads
+import time
+from uuid import uuid4
 
+from flask_socketio import emit, join_room, leave_room
 from redis import StrictRedis
 
+from .events import decode, raw, replay, streams_key
+
+namespace = '/pulsar'
+message_type = 'ansible'
+
+
+def rooms(data):
+    """Rooms interested in an ansible event"""
+    result = []
+    provision_id = data.get('provision_id')
+    if provision_id is not None:
+        result.append('provision:{}'.format(provision_id))
+    cluster_id = data.get('cluster_id')
+    if cluster_id is not None:
+        result.append('cluster:{}'.format(cluster_id))
+    return result
+
+
+def subscription(data):
+    """
+    The one room a join subscribes to: the provision when given, else the
+    cluster. Events go to both rooms, so a client in both would get each
+    event twice.
+    """
+    provision_id = data.get('provision_id')
+    if provision_id is not None:
+        return 'provision:{}'.format(provision_id)
+    cluster_id = data.get('cluster_id')
+    if cluster_id is not None:
+        return 'cluster:{}'.format(cluster_id)
+    return None
+
+
+def register_handlers(socketio, redis_host):
+    redis = StrictRedis(host=redis_host)
+
+    @socketio.on('join', namespace=namespace)
+    def join(data):
+        room = subscription(data)
+        if room is None:
+            return
+        join_room(room)
+        provision_id = data.get('provision_id')
+        last_event_id = data.get('last_event_id')
+        if provision_id is not None and last_event_id is not None:
+            for event in replay(redis, provision_id, last_event_id):
+                emit(message_type, event)
+
+    @socketio.on('leave', namespace=namespace)
+    def leave(data):
+        room = subscription(data)
+        if room is not None:
+            leave_room(room)
+
+
+def summarize(events):
+    """Collapse runs of identical item events into counters"""
+    result = []
+    for event in events:
+        status = event.get('status') or ''
+        last = result[-1] if result else None
+        if last is None or not status.startswith('item_') or \
+                last.get('status') != status or \
+                last.get('task') != event.get('task'):
+            result.append(event)
+            continue
+        if last.get('type') != 'summary':
+            last = {
+                'type': 'summary',
+                'provision_id': last.get('provision_id'),
+                'cluster_id': last.get('cluster_id'),
+                'task': last.get('task'),
+                'status': status,
+                'count': 1,
+            }
+            result[-1] = last
+        last['count'] += 1
+        last['id'] = event.get('id')
+        last['timestamp'] = event.get('timestamp')
+    return result
+
 
 class SocketThread(threading.Thread):
-    def __init__(self, socketio, redis_host, daemon=True):
+    def __init__(
+        self,
+        socketio,
+        redis_host,
+        daemon=True,
+        block=1000,
+        window=0,
+        summary=True,
+        lock=None,
+        lock_ttl=10,
+        raw=False,
+    ):
         threading.Thread.__init__(self, daemon=daemon)
         self.socketio = socketio
         self.redis = StrictRedis(host=redis_host)
-        self.listener = self.redis.pubsub()
-        self.listener.subscribe('ansible')
+        self.block = block
+        self.window = window
+        self.summary = summary
+        self.raw = raw
+        self.pending = {}
+        self.flushed = time.time()
+        self.lock = lock
+        self.lock_ttl = lock_ttl
+        self.token = uuid4().hex.encode('utf-8')
+        self.leader = lock is None
+        self.streams = {}
+        if self.leader:
+            self.follow()
+
+    def follow(self):
+        """Start relaying active streams from their latest event"""
+        self.streams = {}
+        for stream in self.redis.smembers(streams_key):
+            last = self.redis.xrevrange(stream, count=1)
+            self.streams[stream] = last[0][0] if last else b'0-0'
+
+    def lead(self):
+        """Take or renew the relay lock, True if this thread holds it"""
+        if self.lock is None:
+            return True
+        acquired = self.redis.set(
+            self.lock,
+            self.token,
+            nx=True,
+            ex=self.lock_ttl,
+        )
+        if not acquired and self.redis.get(self.lock) == self.token:
+            acquired = self.redis.expire(self.lock, self.lock_ttl)
+        if acquired and not self.leader:
+            self.follow()
+        self.leader = bool(acquired)
+        return self.leader
+
+    def send(self, data):
+        for room in rooms(data):
+            self.socketio.emit(
+                message_type,
+                data,
+                namespace=namespace,
+                room=room,
+            )
+
+    def flush(self):
+        """Emit pending events as one batch frame per provision"""
+        for provision_id, events in self.pending.items():
+            if self.summary:
+                events = summarize(events)
+            self.send(
+                {
+                    'type': 'batch',
+                    'provision_id': provision_id,
+                    'cluster_id': events[-1].get('cluster_id'),
+                    'id': events[-1].get('id'),
+                    'events': events,
+                }
+            )
+        self.pending = {}
+        self.flushed = time.time()
+
+    def emit(self, stream, entries):
+        for event_id, fields in entries:
+            self.streams[stream] = event_id
+            if self.raw:
+                data = raw(event_id, fields)
+            else:
+                data = decode(event_id, fields)
+            if not self.window:
+                self.send(data)
+                continue
+            provision_id = data.get('provision_id')
+            self.pending.setdefault(provision_id, []).append(data)
+
+    def drain(self, stream):
+        """Relay what is left of a closed stream and stop following it"""
+        last_id = self.streams[stream]
+        entries = self.redis.xrange(stream, min=last_id)
+        self.emit(stream, [entry for entry in entries if entry[0] != last_id])
+        del self.streams[stream]
 
     def run(self):
-        message_type = 'ansible'
-        for message in self.listener.listen():
-            if message['type'] == 'message':
-                data = loads(message['data'])
-                self.socketio.emit(
-                    message_type,
-                    data,
-                    namespace='/pulsar',
-                )
+        while True:
+            if not self.lead():
+                time.sleep(self.lock_ttl / 2)
+                continue
+            active = self.redis.smembers(streams_key)
+            for stream in active:
+                self.streams.setdefault(stream, b'0-0')
+            for stream in list(self.streams):
+                if stream not in active:
+                    self.drain(stream)
+            block = self.block
+            if self.pending:
+                elapsed = (time.time() - self.flushed) * 1000
+                if elapsed >= self.window:
+                    self.flush()
+                else:
+                    block = max(1, int(self.window - elapsed))
+            if not self.streams:
+                time.sleep(block / 1000)
+                continue
+            if not self.pending:
+                self.flushed = time.time()
+            response = self.redis.xread(self.streams, block=block)
+            for stream, entries in response or []:
+                self.emit(stream, entries)
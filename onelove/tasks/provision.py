@@ -1,53 +1,335 @@
 import os
-import subprocess
+import shutil
+import tempfile
+import time
 from datetime import datetime
 from json import dumps
 
+from bson import ObjectId
+from celery import chord
 from celery.utils.log import get_task_logger
+import eventlet
+from eventlet.green import subprocess
 from flask import current_app
-from redis import StrictRedis
 
-from ..models.provision import Provision
+from .. import facts, inventory
+from ..events import close, publish
+from ..incremental import plan, record
+from ..leases import release, renew
+from ..models.cluster import ExecutionProfile
+from ..models.provision import Provision, ProvisionLog
+from ..playbooks import compiled, write
 from .celery import celery
+from .roles import galaxy_roles, role_cache
 
 logger = get_task_logger(__name__)
 
 datetime_format = '%Y-%m-%dT%H:%M:%S:%f'
 
 
-@celery.task(bind=True)
-def playbook(self, provision_id, *args):
+def environment(config, provision_id, cluster_id=None):
+    """Environment of one ansible-playbook child process"""
+    env = dict(os.environ)
+    env.pop('CLUSTER_ID', None)
+    env['PROVISION_ID'] = str(provision_id)
+    if cluster_id is not None:
+        env['CLUSTER_ID'] = cluster_id
+    env['REDIS_HOST'] = config['REDIS_HOST']
+    env['MONGODB_SETTINGS'] = dumps(config['MONGODB_SETTINGS'])
+    env['LOG_BATCH_SIZE'] = str(config['LOG_BATCH_SIZE'])
+    env['LOG_FLUSH_INTERVAL'] = str(config['LOG_FLUSH_INTERVAL'])
+    env['LOG_QUEUE_SIZE'] = str(config['LOG_QUEUE_SIZE'])
+    env['LOG_QUEUE_OVERFLOW'] = config['LOG_QUEUE_OVERFLOW']
+    env['LOG_MAX_SIZE'] = str(config['LOG_MAX_SIZE'])
+    env['LOG_STOP_TIMEOUT'] = str(config['LOG_STOP_TIMEOUT'])
+    env['EVENT_STREAM_MAXLEN'] = str(config['EVENT_STREAM_MAXLEN'])
+    env['EVENT_CODEC'] = config['EVENT_CODEC']
+    if config['LOG_SPILL_DIR'] is not None:
+        env['LOG_SPILL_DIR'] = config['LOG_SPILL_DIR']
+    env.update(facts.environment(config))
+    return env
+
+
+def read_lines(stream, max_size):
+    """
+    Lines of stream cut to max_size bytes; the rest of a longer line is
+    read and dropped so it is never held in memory
+    """
+    while True:
+        line = stream.readline(max_size)
+        if not line:
+            return
+        rest = line
+        while not rest.endswith(b'\n'):
+            rest = stream.readline(max_size)
+            if not rest:
+                break
+        yield line
+
+
+class OutputBatch(object):
+    """
+    Lines printed by ansible-playbook, published and persisted in batches
+    """
+    def __init__(self, redis, config, provision_id, cluster_id=None):
+        self.redis = redis
+        self.provision_id = provision_id
+        self.cluster_id = cluster_id
+        self.batch_size = config['OUTPUT_BATCH_SIZE']
+        self.interval = config['LOG_FLUSH_INTERVAL']
+        self.max_size = config['LOG_MAX_SIZE']
+        self.maxlen = config['EVENT_STREAM_MAXLEN']
+        self.codec = config['EVENT_CODEC']
+        self.lines = []
+        self.flushed = time.time()
+
+    def add(self, line):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        self.lines.append(line.rstrip('\n')[:self.max_size])
+        elapsed = time.time() - self.flushed
+        if len(self.lines) >= self.batch_size or elapsed >= self.interval:
+            self.flush()
+
+    def tick(self):
+        """Flush on interval while ansible-playbook prints nothing"""
+        while True:
+            eventlet.sleep(self.interval)
+            if time.time() - self.flushed >= self.interval:
+                self.flush()
+
+    def flush(self):
+        self.flushed = time.time()
+        lines = self.lines
+        self.lines = []
+        if not lines:
+            return
+        timestamp = datetime.utcnow().strftime(datetime_format)
+        log_id = ObjectId()
+        data = {
+            'provision_id': self.provision_id,
+            'cluster_id': self.cluster_id,
+            'log_id': str(log_id),
+            'lines': lines,
+            'status': 'output',
+            'type': 'output',
+            'timestamp': timestamp,
+        }
+        publish(self.redis, data, self.maxlen, self.codec)
+        log = ProvisionLog(
+            id=log_id,
+            provision=ObjectId(self.provision_id),
+            log='\n'.join(lines),
+            status='output',
+            timestamp=timestamp,
+        )
+        ProvisionLog.append(self.provision_id, [log])
+
+
+def keep_leases(redis, provision_id, ttl):
+    """
+    Renew host leases while the playbook runs, so the TTL only frees hosts
+    of provisions whose worker died
+    """
+    while True:
+        renew(redis, provision_id, ttl)
+        eventlet.sleep(ttl / 3)
+
+
+def finish(redis, config, provision, data, status):
+    provision.status = status
+    provision.save()
+    data['status'] = status
+    data['timestamp'] = datetime.utcnow().strftime(datetime_format)
+    publish(redis, data, config['EVENT_STREAM_MAXLEN'], config['EVENT_CODEC'])
+    close(redis, str(provision.id), config['EVENT_STREAM_TTL'])
+    release(redis, provision.id)
+    from .scheduler import schedule
+    schedule()
+    return status
+
+
+def event(provision):
+    return {
+        'provision_id': str(provision.id),
+        'cluster_id': str(provision.cluster.id) if provision.cluster else None,
+        'type': 'log',
+    }
+
+
+def run(redis, config, provision, data, args, limit=None):
+    """Run ansible-playbook for provision, returning its status"""
+    provision_id = str(provision.id)
     playbook_args = list(args)
     playbook_args.insert(0, 'ansible-playbook')
-    playbook_args.append('--ssh-common-args')
-    playbook_args.append(
-        '-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null'
-    )
-    provision = Provision.objects.get(id=provision_id)
+    profile = ExecutionProfile()
+    if provision.cluster is not None and provision.cluster.profile:
+        profile = provision.cluster.profile
+    playbook_args.extend(profile.arguments())
+    provision.profile = profile.to_mongo().to_dict()
     provision.status = 'RUNNING'
     provision.save()
-    redis_host = current_app.config['REDIS_HOST']
-    os.environ['PROVISION_ID'] = str(provision_id)
-    os.environ['REDIS_HOST'] = current_app.config['REDIS_HOST']
-    mongodb_settings = dumps(current_app.config['MONGODB_SETTINGS'])
-    os.environ['MONGODB_SETTINGS'] = mongodb_settings
-    redis = StrictRedis(host=redis_host)
-    data = {
-        'provision_id': provision_id,
-        'status': provision.status,
-        'type': 'log',
-        'timestamp': datetime.utcnow().strftime(datetime_format),
-    }
-    redis.publish('ansible', dumps(data))
-    result = subprocess.run(playbook_args)
-    if result.returncode != 0:
-        provision.status = 'FAILURE'
-        provision.save()
+    env = environment(config, provision_id, data['cluster_id'])
+    env.update(profile.environment())
+    workdir = tempfile.mkdtemp(prefix='onelove-provision-')
+    try:
+        hosts = inventory.cached(redis, provision_id)
+        if hosts is None:
+            hosts = inventory.materialise(
+                redis,
+                provision,
+                config['INVENTORY_TTL'],
+            )
+        playbook_args.extend(['-i', inventory.write(hosts, workdir)])
+        if limit:
+            limit_file = os.path.join(workdir, 'limit')
+            with open(limit_file, 'w') as f:
+                f.write('\n'.join(limit))
+            playbook_args.extend(['--limit', '@{}'.format(limit_file)])
+        if not args and provision.service is not None:
+            result = compiled(
+                redis,
+                provision.service,
+                config['PLAYBOOK_CACHE_TTL'],
+            )
+            playbook_args.insert(1, write(result, workdir))
+        cache = role_cache(config)
+        if cache is not None and provision.service is not None:
+            roles_path = os.path.join(workdir, 'roles')
+            os.mkdir(roles_path)
+            cache.link(galaxy_roles(provision.service), roles_path)
+            env['ANSIBLE_ROLES_PATH'] = os.pathsep.join(
+                [roles_path, env.get('ANSIBLE_ROLES_PATH', '')]
+            ).rstrip(os.pathsep)
         data['status'] = provision.status
-        redis.publish('ansible', dumps(data))
+        data['timestamp'] = datetime.utcnow().strftime(datetime_format)
+        publish(
+            redis,
+            data,
+            config['EVENT_STREAM_MAXLEN'],
+            config['EVENT_CODEC'],
+        )
+        process = subprocess.Popen(
+            playbook_args,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = OutputBatch(redis, config, provision_id, data['cluster_id'])
+        ticker = eventlet.spawn(output.tick)
+        keeper = eventlet.spawn(
+            keep_leases,
+            redis,
+            provision_id,
+            config['HOST_LEASE_TTL'],
+        )
+        try:
+            for line in read_lines(process.stdout, output.max_size):
+                output.add(line)
+        finally:
+            ticker.kill()
+            keeper.kill()
+        output.flush()
+        returncode = process.wait()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 'SUCCESS' if returncode == 0 else 'FAILURE'
+
+
+@celery.task(bind=True)
+def playbook(self, provision_id, *args, shard=None, limit=None):
+    provision = Provision.objects.get(id=provision_id)
+    config = current_app.config
+    redis = current_app.redis
+    data = event(provision)
+    if shard is not None:
+        data['shard'] = shard
+    try:
+        status = run(redis, config, provision, data, args, limit)
+        record(provision, status, limit, role_cache(config))
+    except Exception:
+        # an error must not leave the provision RUNNING: that would block
+        # its cluster and hold its host leases
+        logger.exception('Provision {} failed'.format(provision_id))
+        status = 'FAILURE'
+    if shard is None:
+        return finish(redis, config, provision, data, status)
+    Provision.objects(id=provision_id).update_one(
+        **{'set__shard_status__{}'.format(shard): status}
+    )
+    return status
+
+
+@celery.task(bind=True)
+def merge(self, statuses, provision_id):
+    """Chord callback: final status of a sharded provision"""
+    provision = Provision.objects.get(id=provision_id)
+    config = current_app.config
+    redis = current_app.redis
+    failed = [status for status in statuses if status != 'SUCCESS']
+    status = 'FAILURE' if failed else 'SUCCESS'
+    return finish(redis, config, provision, event(provision), status)
+
+
+@celery.task
+def fail(request, exc, traceback, provision_id):
+    """Chord error callback: a shard or the merge itself raised"""
+    provision = Provision.objects.get(id=provision_id)
+    if provision.status not in ['QUEUED', 'RUNNING']:
         return provision.status
-    provision.status = 'SUCCESS'
-    provision.save()
-    data['status'] = provision.status
-    redis.publish('ansible', dumps(data))
-    return provision.status
+    config = current_app.config
+    redis = current_app.redis
+    return finish(redis, config, provision, event(provision), 'FAILURE')
+
+
+@celery.task(bind=True)
+def unchanged(self, provision_id):
+    """Finish an incremental provision none of whose hosts changed"""
+    provision = Provision.objects.get(id=provision_id)
+    config = current_app.config
+    redis = current_app.redis
+    data = event(provision)
+    data['skipped'] = provision.skipped
+    return finish(redis, config, provision, data, 'SUCCESS')
+
+
+def start(provision_id, args, shards=1):
+    """
+    Queue a provision. With shards > 1 the cluster hosts are split into
+    that many batches, each run by its own playbook task. Incremental
+    provisions only run on hosts that changed or failed last time.
+    """
+    provision = Provision.objects.get(id=provision_id)
+    config = current_app.config
+    redis = current_app.redis
+    inventory.materialise(redis, provision, config['INVENTORY_TTL'])
+    hostnames = []
+    limit = None
+    if provision.incremental:
+        hostnames, skipped = plan(provision, role_cache(config))
+        provision.skipped = skipped
+        provision.save()
+        if not hostnames:
+            # start runs under the scheduler lock, and finishing schedules
+            # again, so nothing-to-do provisions finish in their own task
+            return unchanged.delay(provision_id)
+        limit = hostnames
+    elif shards > 1 and provision.cluster is not None:
+        hostnames = [host.hostname for host in provision.cluster.hosts()]
+    shards = max(1, min(shards, len(hostnames)))
+    batches = [hostnames[index::shards] for index in range(shards)]
+    batches = [batch for batch in batches if batch]
+    if len(batches) < 2:
+        return playbook.delay(provision_id, *args, limit=limit)
+    Provision.objects(id=provision_id).update_one(
+        set__shards=len(batches),
+        set__shard_status={},
+    )
+    header = [
+        playbook.signature(
+            [provision_id] + list(args),
+            {'shard': index, 'limit': batch},
+        ) for index, batch in enumerate(batches)
+    ]
+    callback = merge.s(provision_id).on_error(fail.s(provision_id))
+    return chord(header)(callback)
@@ -0,0 +1,34 @@
+from celery.utils.log import get_task_logger
+from flask import current_app
+
+from ..models.service import Service
+from ..roles import RoleCache
+from .celery import celery
+
+logger = get_task_logger(__name__)
+
+
+def role_cache(config):
+    if config['ROLE_CACHE_PATH'] is None:
+        return None
+    return RoleCache(config['ROLE_CACHE_PATH'], config['ROLE_CACHE_SIZE'])
+
+
+def galaxy_roles(service):
+    return [
+        application.galaxy_role for application in service.applications
+        if application.galaxy_role
+    ]
+
+
+@celery.task(bind=True)
+def prefetch(self, service_id):
+    """Warm the role cache with the roles of a service"""
+    cache = role_cache(current_app.config)
+    if cache is None:
+        return
+    try:
+        service = Service.objects.get(id=service_id)
+    except Service.DoesNotExist:
+        return
+    cache.prefetch(galaxy_roles(service))
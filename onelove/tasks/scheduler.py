@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from celery.utils.log import get_task_logger
+from flask import current_app
+
+from ..events import close, publish
+from ..leases import acquire, release
+from ..models.provision import Provision
+
+logger = get_task_logger(__name__)
+
+priorities = {
+    'low': 0,
+    'normal': 5,
+    'high': 9,
+}
+
+active_statuses = ['QUEUED', 'RUNNING']
+
+max_shards = 64
+
+
+def hostnames(provision):
+    if provision.cluster is None:
+        return []
+    return [host.hostname for host in provision.cluster.hosts()]
+
+
+def request(
+    cluster,
+    service,
+    user=None,
+    priority='normal',
+    args=[],
+    shards=1,
+    incremental=False,
+):
+    """
+    Ask for a provision of service on cluster. A PENDING provision of the
+    same pair, mode and arguments is reused (keeping the higher priority)
+    instead of queueing identical work.
+    """
+    provision = Provision.objects(
+        cluster=cluster,
+        service=service,
+        status='PENDING',
+        args=list(args),
+        shards=shards,
+        incremental=incremental,
+    ).modify(
+        upsert=True,
+        new=True,
+        set_on_insert__user=user,
+        max__priority=priorities[priority],
+    )
+    schedule()
+    return provision
+
+
+def abandon(redis, config, provision):
+    """
+    Fail a provision that could not start, without scheduling again as
+    finish would: this runs under the scheduler lock
+    """
+    Provision.objects(id=provision.id).update_one(set__status='FAILURE')
+    release(redis, provision.id)
+    data = {
+        'provision_id': str(provision.id),
+        'cluster_id': str(provision.cluster.id) if provision.cluster else None,
+        'type': 'log',
+        'status': 'FAILURE',
+        'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S:%f'),
+    }
+    publish(redis, data, config['EVENT_STREAM_MAXLEN'], config['EVENT_CODEC'])
+    close(redis, str(provision.id), config['EVENT_STREAM_TTL'])
+
+
+def schedule():
+    """
+    Dispatch PENDING provisions by priority while their cluster is below
+    PROVISION_CLUSTER_CONCURRENCY active provisions and none of their
+    hosts is leased to another provision
+    """
+    from .provision import start
+    config = current_app.config
+    limit = config['PROVISION_CLUSTER_CONCURRENCY']
+    lease_ttl = config['HOST_LEASE_TTL']
+    redis = current_app.redis
+    with redis.lock('provision:scheduler', timeout=60):
+        active = {}
+        pending = Provision.objects(status='PENDING').order_by(
+            '-priority',
+            'id',
+        )
+        for provision in pending:
+            cluster_id = provision.cluster.id if provision.cluster else None
+            if cluster_id not in active:
+                active[cluster_id] = Provision.objects(
+                    cluster=cluster_id,
+                    status__in=active_statuses,
+                ).count()
+            if active[cluster_id] >= limit:
+                continue
+            hosts = hostnames(provision)
+            if not acquire(redis, provision.id, hosts, lease_ttl):
+                continue
+            dispatched = Provision.objects(
+                id=provision.id,
+                status='PENDING',
+            ).update_one(set__status='QUEUED')
+            if not dispatched:
+                release(redis, provision.id)
+                continue
+            active[cluster_id] += 1
+            try:
+                start(str(provision.id), provision.args, provision.shards)
+            except Exception:
+                logger.exception('Provision {} failed to start'.format(
+                    provision.id,
+                ))
+                abandon(redis, config, provision)
+                active[cluster_id] -= 1
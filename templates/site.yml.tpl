@@ -3,7 +3,6 @@
 
 ---
 - name: SERVICE provisioning
-  hosts: SERVICE
+  hosts: all
   roles:
-    - onelove-roles.freebsd-common
-    - devel
+ROLES
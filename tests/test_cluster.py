@@ -0,0 +1,140 @@
+from onelove.models.cluster import Cluster, ClusterHost, ExecutionProfile
+from onelove.models.provider import HostSSH, ProviderSSH
+
+from .base import Base
+
+
+class TestExecutionProfile:
+    def test_defaults(self):
+        profile = ExecutionProfile()
+        arguments = profile.arguments()
+        assert arguments[arguments.index('--forks') + 1] == '5'
+        env = profile.environment()
+        assert env['ANSIBLE_STRATEGY'] == 'linear'
+        assert 'ControlPersist=60s' in env['ANSIBLE_SSH_ARGS']
+
+    def test_custom(self):
+        profile = ExecutionProfile(
+            forks=50,
+            strategy='free',
+            pipelining=True,
+            control_persist=0,
+            timeout=30,
+        )
+        arguments = profile.arguments()
+        assert arguments[arguments.index('--forks') + 1] == '50'
+        assert arguments[arguments.index('--timeout') + 1] == '30'
+        env = profile.environment()
+        assert env['ANSIBLE_PIPELINING'] == 'True'
+        assert 'ControlMaster=no' in env['ANSIBLE_SSH_ARGS']
+
+
+class TestClusterHosts(Base):
+    def make_provider(self, name='ssh', hosts=None):
+        if hosts is None:
+            hosts = [
+                HostSSH(hostname='web1', tags=['web']),
+                HostSSH(hostname='db1', tags=['db']),
+            ]
+        provider = ProviderSSH(name=name, hosts=hosts)
+        provider.save()
+        return provider
+
+    def make_cluster(self, providers, tags=['web']):
+        cluster = Cluster(name='test', providers=providers, tags=tags)
+        cluster.save()
+        return cluster
+
+    def hostnames(self, cluster):
+        return sorted(
+            host.hostname for host in ClusterHost.objects(cluster=cluster)
+        )
+
+    def test_create(self):
+        cluster = self.make_cluster([self.make_provider()])
+        assert self.hostnames(cluster) == ['web1']
+
+    def test_add_host(self):
+        provider = self.make_provider()
+        cluster = self.make_cluster([provider])
+        provider.hosts.append(HostSSH(hostname='web2', tags=['web']))
+        provider.save()
+        assert self.hostnames(cluster) == ['web1', 'web2']
+
+    def test_unchanged_rows_kept(self):
+        provider = self.make_provider()
+        cluster = self.make_cluster([provider])
+        web1 = ClusterHost.objects.get(cluster=cluster, hostname='web1')
+        provider.hosts.append(HostSSH(hostname='web2', tags=['web']))
+        provider.save()
+        cluster.refresh_hosts()
+        assert self.hostnames(cluster) == ['web1', 'web2']
+        assert ClusterHost.objects.get(
+            cluster=cluster,
+            hostname='web1',
+        ).id == web1.id
+
+    def test_retag_host(self):
+        provider = self.make_provider()
+        cluster = self.make_cluster([provider])
+        provider.hosts[1].tags = ['web']
+        provider.save()
+        assert self.hostnames(cluster) == ['db1', 'web1']
+
+    def test_remove_host(self):
+        provider = self.make_provider()
+        cluster = self.make_cluster([provider])
+        provider.destroy('web1')
+        provider.save()
+        assert self.hostnames(cluster) == []
+
+    def test_add_provider(self):
+        cluster = self.make_cluster([self.make_provider()])
+        other = self.make_provider(
+            'other',
+            [HostSSH(hostname='web3', tags=['web'])],
+        )
+        cluster.providers.append(other)
+        cluster.save()
+        assert self.hostnames(cluster) == ['web1', 'web3']
+
+    def test_remove_provider(self):
+        provider = self.make_provider()
+        other = self.make_provider(
+            'other',
+            [HostSSH(hostname='web3', tags=['web'])],
+        )
+        cluster = self.make_cluster([provider, other])
+        cluster.providers = [other]
+        cluster.save()
+        assert self.hostnames(cluster) == ['web3']
+
+    def test_cluster_tags(self):
+        cluster = self.make_cluster([self.make_provider()])
+        cluster.tags = ['db']
+        cluster.save()
+        assert self.hostnames(cluster) == ['db1']
+
+    def test_rename_provider(self):
+        provider = self.make_provider()
+        cluster = Cluster(
+            name='test',
+            providers=[provider],
+            selector='provider:ssh and web',
+        )
+        cluster.save()
+        assert self.hostnames(cluster) == ['web1']
+        provider.name = 'renamed'
+        provider.save()
+        assert self.hostnames(cluster) == []
+
+    def test_delete_provider(self):
+        provider = self.make_provider()
+        cluster = self.make_cluster([provider])
+        provider.delete()
+        assert self.hostnames(cluster) == []
+
+    def test_delete_cluster(self):
+        cluster = self.make_cluster([self.make_provider()])
+        cluster.delete()
+        assert self.hostnames(cluster) == []
@@ -0,0 +1,75 @@
+from bson import ObjectId
+from onelove.inventory import build, static
+from onelove.models.cluster import Cluster, ClusterHost
+from onelove.models.provider import HostSSH, ProviderSSH
+from onelove.models.provision import Provision
+
+
+def make_provision():
+    provider = ProviderSSH(
+        id=ObjectId(),
+        name='ssh',
+        hosts=[
+            HostSSH(hostname='web1', ip='10.0.0.1', tags=['web']),
+            HostSSH(hostname='web2', tags=['web', 'front-end']),
+            HostSSH(hostname='db1', tags=['db']),
+            HostSSH(hostname='spare1'),
+            HostSSH(hostname='mail1', tags=['mail']),
+        ],
+    )
+    cluster = Cluster(
+        name='test',
+        providers=[provider],
+        selector='web or db or host:spare*',
+    )
+    return Provision(cluster=cluster)
+
+
+def inventory(provision):
+    cluster = provision.cluster
+    hosts = ClusterHost.build(cluster, cluster.providers[0])
+    return build(provision, hosts)
+
+
+class TestInventory:
+    def test_build(self):
+        data = inventory(make_provision())
+        hostvars = data['_meta']['hostvars']
+        assert hostvars['web1']['ansible_host'] == '10.0.0.1'
+        assert 'ansible_host' not in hostvars['db1']
+        assert 'mail1' not in hostvars
+
+    def test_groups(self):
+        data = inventory(make_provision())
+        assert data['all']['children'] == [
+            'provider_ssh',
+            'tag_db',
+            'tag_front_end',
+            'tag_web',
+            'ungrouped',
+        ]
+        assert data['tag_web']['hosts'] == ['web1', 'web2']
+        assert data['tag_front_end']['hosts'] == ['web2']
+        assert data['ungrouped']['hosts'] == ['spare1']
+        assert len(data['provider_ssh']['hosts']) == 4
+
+    def test_reserved_tags(self):
+        provision = make_provision()
+        provision.cluster.selector = 'not mail'
+        provision.cluster.providers[0].hosts.append(
+            HostSSH(hostname='odd1', tags=['all', 'ungrouped', 'provider_ssh'])
+        )
+        data = inventory(provision)
+        assert data['tag_all']['hosts'] == ['odd1']
+        assert data['tag_ungrouped']['hosts'] == ['odd1']
+        assert data['ungrouped']['hosts'] == ['spare1']
+        assert data['tag_provider_ssh']['hosts'] == ['odd1']
+        assert len(data['provider_ssh']['hosts']) == 5
+
+    def test_static(self):
+        data = static(inventory(make_provision()))
+        assert len(data['all']['hosts']) == 4
+        assert set(data['all']['children']['tag_web']['hosts']) == {
+            'web1',
+            'web2',
+        }
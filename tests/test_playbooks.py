@@ -0,0 +1,24 @@
+from onelove.models.service import Application, Service
+from onelove.playbooks import render, service_hash
+
+
+def make_service(*galaxy_roles):
+    return Service(
+        name='web',
+        applications=[
+            Application(name=role, galaxy_role=role) for role in galaxy_roles
+        ],
+    )
+
+
+class TestPlaybooks:
+    def test_render(self):
+        result = render(make_service('geerlingguy.nginx,2.6.0', 'devel'))
+        assert 'name: web provisioning' in result['playbook']
+        assert '    - geerlingguy.nginx\n    - devel' in result['playbook']
+        assert '  version: 2.6.0' in result['requirements']
+
+    def test_service_hash(self):
+        first = make_service('devel')
+        assert service_hash(first) == service_hash(make_service('devel'))
+        assert service_hash(first) != service_hash(make_service('nginx'))
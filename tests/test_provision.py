@@ -0,0 +1,23 @@
+from onelove.models.provision import Provision, ProvisionLog
+
+from .base import Base
+
+
+class TestProvisionLogMigration(Base):
+    def test_migrate(self):
+        collection = Provision._get_collection()
+        provision_id = collection.insert_one({
+            'status': 'SUCCESS',
+            'logs': [
+                {'status': 'ok', 'host': 'web1', 'log': 'done'},
+                {'status': 'failed', 'host': 'web2', 'log': 'boom'},
+            ],
+        }).inserted_id
+        provision = Provision.objects.get(id=provision_id)
+        assert ProvisionLog.migrate() >= 1
+        provision.reload()
+        assert provision.log_count == 2
+        assert provision.stats == {'ok': 1, 'failed': 1}
+        hosts = set(log.host for log in provision.log_entries())
+        assert hosts == {'web1', 'web2'}
+        assert 'logs' not in collection.find_one({'_id': provision_id})
@@ -0,0 +1,39 @@
+import os
+
+from onelove.roles import RoleCache, digest, key, split
+
+
+class TestRoles:
+    def test_split(self):
+        assert split('onelove-roles.freebsd-common') == (
+            'onelove-roles.freebsd-common',
+            'latest',
+        )
+        assert split('geerlingguy.nginx, 2.6.0') == (
+            'geerlingguy.nginx',
+            '2.6.0',
+        )
+
+    def test_key(self):
+        assert key('geerlingguy.nginx,2.6.0') == 'geerlingguy.nginx@2.6.0'
+
+    def test_digest(self, tmpdir):
+        first = tmpdir.mkdir('first')
+        second = tmpdir.mkdir('second')
+        for root in [first, second]:
+            root.mkdir('tasks').join('main.yml').write('---\n')
+        assert digest(str(first)) == digest(str(second))
+        first.mkdir('meta').join('.galaxy_install_info').write(
+            'install_date: today\n'
+        )
+        assert digest(str(first)) == digest(str(second))
+        first.join('tasks', 'main.yml').write('--- \n')
+        assert digest(str(first)) != digest(str(second))
+
+    def test_resolved(self, tmpdir):
+        cache = RoleCache(str(tmpdir))
+        assert cache.resolved('geerlingguy.nginx') is None
+        target = os.path.join(cache.objects, 'abc')
+        os.mkdir(target)
+        os.symlink(target, cache.ref('geerlingguy.nginx'))
+        assert cache.resolved('geerlingguy.nginx') == 'abc'
@@ -0,0 +1,164 @@
+from uuid import uuid4
+
+import pytest
+from flask import current_app
+from onelove.incremental import plan, record
+from onelove.leases import acquire, owner, release
+from onelove.models.cluster import Cluster
+from onelove.models.provider import HostSSH, ProviderSSH
+from onelove.models.provision import Provision, ProvisionLog
+from onelove.models.service import Service
+from onelove.tasks.scheduler import priorities, request, schedule
+
+from .base import Base
+
+
+@pytest.fixture
+def started(app, monkeypatch):
+    from onelove.tasks import provision
+    calls = []
+    monkeypatch.setattr(
+        provision,
+        'start',
+        lambda provision_id, args, shards=1: calls.append(provision_id),
+    )
+    return calls
+
+
+def make_provider():
+    prefix = uuid4().hex
+    provider = ProviderSSH(
+        name=prefix,
+        hosts=[
+            HostSSH(hostname='{}-web1'.format(prefix), tags=['web']),
+            HostSSH(hostname='{}-web2'.format(prefix), tags=['web']),
+        ],
+    )
+    provider.save()
+    return provider
+
+
+def make_cluster(provider=None):
+    cluster = Cluster(
+        name=uuid4().hex,
+        providers=[provider or make_provider()],
+        tags=['web'],
+    )
+    cluster.save()
+    return cluster
+
+
+def make_service():
+    service = Service(name=uuid4().hex)
+    service.save()
+    return service
+
+
+def pending(cluster, service, priority='normal'):
+    provision = Provision(
+        cluster=cluster,
+        service=service,
+        priority=priorities[priority],
+    )
+    provision.save()
+    return provision
+
+
+class TestLeases(Base):
+    def test_conflict_and_release(self):
+        redis = current_app.redis
+        hostname = uuid4().hex
+        assert acquire(redis, 'p1', [hostname], 60)
+        assert not acquire(redis, 'p2', [hostname, uuid4().hex], 60)
+        assert owner(redis, hostname) == 'p1'
+        release(redis, 'p1')
+        assert owner(redis, hostname) is None
+        assert acquire(redis, 'p2', [hostname], 60)
+        release(redis, 'p2')
+
+
+class TestScheduler(Base):
+    def test_coalesce(self, started):
+        cluster = make_cluster()
+        service = make_service()
+        Provision(cluster=cluster, service=service, status='RUNNING').save()
+        first = request(cluster, service, priority='low')
+        second = request(cluster, service, priority='high')
+        assert first.id == second.id
+        assert second.priority == priorities['high']
+        other = request(cluster, service, incremental=True)
+        assert other.id != first.id
+        assert str(first.id) not in started
+
+    def test_priority(self, started):
+        service = make_service()
+        low = pending(make_cluster(), service, 'low')
+        high = pending(make_cluster(), service, 'high')
+        schedule()
+        assert started.index(str(high.id)) < started.index(str(low.id))
+        for provision in [low, high]:
+            release(current_app.redis, provision.id)
+
+    def test_cluster_limit(self, started):
+        cluster = make_cluster()
+        service = make_service()
+        first = pending(cluster, service, 'high')
+        second = pending(cluster, service)
+        schedule()
+        assert str(first.id) in started
+        assert str(second.id) not in started
+        second.reload()
+        assert second.status == 'PENDING'
+        release(current_app.redis, first.id)
+
+    def test_lease_conflict(self, started):
+        from onelove.tasks.provision import event, finish
+        provider = make_provider()
+        service = make_service()
+        first = pending(make_cluster(provider), service, 'high')
+        second = pending(make_cluster(provider), service)
+        schedule()
+        assert str(first.id) in started
+        assert str(second.id) not in started
+        hostname = provider.hosts[0].hostname
+        assert owner(current_app.redis, hostname) == str(first.id)
+        first.reload()
+        finish(
+            current_app.redis,
+            current_app.config,
+            first,
+            event(first),
+            'SUCCESS',
+        )
+        assert str(second.id) in started
+        assert owner(current_app.redis, hostname) == str(second.id)
+        release(current_app.redis, second.id)
+
+
+class TestIncremental(Base):
+    def test_plan_and_record(self):
+        cluster = make_cluster()
+        hostnames = sorted(host.hostname for host in cluster.hosts())
+        provision = pending(cluster, make_service())
+        changed, skipped = plan(provision)
+        assert sorted(changed) == hostnames
+        assert skipped == []
+        ProvisionLog(
+            provision=provision,
+            host=hostnames[1],
+            status='failed',
+        ).save()
+        record(provision, 'SUCCESS')
+        changed, skipped = plan(provision)
+        assert changed == [hostnames[1]]
+        assert skipped == [hostnames[0]]
+
+    def test_host_change(self):
+        provider = make_provider()
+        cluster = make_cluster(provider)
+        provision = pending(cluster, make_service())
+        record(provision, 'SUCCESS')
+        provider.hosts[0].ip = '10.0.0.1'
+        provider.save()
+        changed, skipped = plan(provision)
+        assert changed == [provider.hosts[0].hostname]
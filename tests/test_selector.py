@@ -0,0 +1,40 @@
+import pytest
+
+from onelove.models.provider import HostSSH
+from onelove.selector import Selector, SelectorError, compile_selector
+
+
+class TestSelector:
+    def test_match(self):
+        selector = Selector('(tag:web or api) and not host:*-staging')
+        web = HostSSH(hostname='web1', tags=['web'])
+        staging = HostSSH(hostname='web1-staging', tags=['web'])
+        db = HostSSH(hostname='db1', tags=['db'])
+        assert selector.match(web)
+        assert not selector.match(staging)
+        assert not selector.match(db)
+
+    def test_provider(self):
+        selector = Selector('provider:dc1 and web')
+        host = HostSSH(hostname='web1', tags=['web'])
+        assert selector.match(host, 'dc1')
+        assert not selector.match(host, 'dc2')
+
+    def test_query(self):
+        selector = Selector('web and not host:db?')
+        assert selector.query() == {
+            '$and': [
+                {'hosts.tags': 'web'},
+                {'$nor': [{'hosts.hostname': {'$regex': '^db.$'}}]},
+            ],
+        }
+        assert selector.negated()
+        assert not Selector('web or api').negated()
+
+    def test_cached(self):
+        assert compile_selector('web') is compile_selector('web')
+
+    @pytest.mark.parametrize('text', ['', 'web and', '(web', 'os:linux'])
+    def test_invalid(self, text):
+        with pytest.raises(SelectorError):
+            Selector(text)
@@ -0,0 +1,49 @@
+from onelove.socket import rooms, subscription, summarize
+
+
+def event(id, status, task='loop', host='host1'):
+    return {
+        'id': id,
+        'provision_id': 'p1',
+        'cluster_id': 'c1',
+        'host': host,
+        'status': status,
+        'task': task,
+        'timestamp': id,
+        'type': 'log',
+    }
+
+
+class TestSocket:
+    def test_rooms(self):
+        assert rooms({'provision_id': 'p1', 'cluster_id': 'c1'}) == [
+            'provision:p1',
+            'cluster:c1',
+        ]
+        assert rooms({}) == []
+
+    def test_subscription(self):
+        data = {'provision_id': 'p1', 'cluster_id': 'c1'}
+        assert subscription(data) == 'provision:p1'
+        assert subscription({'cluster_id': 'c1'}) == 'cluster:c1'
+        assert subscription({}) is None
+
+    def test_summarize(self):
+        events = [
+            event('1', 'ok', task='setup'),
+            event('2', 'item_ok'),
+            event('3', 'item_ok', host='host2'),
+            event('4', 'item_ok'),
+            event('5', 'item_failed'),
+        ]
+        result = summarize(events)
+        assert len(result) == 3
+        assert result[0]['id'] == '1'
+        assert result[1]['type'] == 'summary'
+        assert result[1]['count'] == 3
+        assert result[1]['id'] == '4'
+        assert result[2]['status'] == 'item_failed'
+
+    def test_summarize_single_item(self):
+        result = summarize([event('1', 'item_ok')])
+        assert result[0]['type'] == 'log'